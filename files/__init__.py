@@ -1,10 +1,12 @@
 """
 Gherkin steps related to download files.
 
-It assumes `aloe.world.DOWNLOAD_DIR` exists.
+It assumes `aloe.world.DOWNLOAD_DIR` exists. Set `aloe.world.ISOLATE_DOWNLOADS`
+to use a separate download directory per scenario.
 """
 
 import aloe_webdriver_extra.files.csv
 import aloe_webdriver_extra.files.download
+import aloe_webdriver_extra.files.json
 import aloe_webdriver_extra.files.pdf
 import aloe_webdriver_extra.files.xlsx
@@ -2,9 +2,20 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 import csv
-from codecs import open  # pylint:disable=redefined-builtin
-
-from aloe import step
+import hashlib
+import io
+import itertools
+import locale
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from itertools import zip_longest
+except ImportError:
+    from itertools import izip_longest as zip_longest
+
+from aloe import step, world
 from aloe.tools import guess_types
 from nose.tools import (
     assert_equal,
@@ -17,27 +28,72 @@ from aloe_webdriver_extra.util import (
     NUMBER,
     get_lookup_function,
 )
-from .util import wait_for_file
+from .util import (
+    DECOMPRESSORS,
+    PREFETCH_PARSERS,
+    find_rows,
+    open_file,
+    parse_file,
+    split_archive_member,
+    wait_for_file,
+)
 
 
 # Do not limit output from diff in assert_equal.
 assert_equal.__self__.maxDiff = None  # pylint:disable=no-member
 
+# Number of processes matching rows of CSV files in parallel; None to use one
+# per CPU.
+PARALLEL_PROCESSES = None
+
+# Process pool matching rows of CSV files, created on first use. It is reused
+# by the retries of the steps instead of starting new processes every time.
+PARALLEL_EXECUTOR = None
+
+# Size in bytes of the blocks read when splitting a CSV file into chunks.
+SPLIT_BLOCK_SIZE = 1024 * 1024
+
+# Maximum number of differing rows reported when comparing a CSV file against
+# a reference file.
+MAX_REPORTED_DIFFERENCES = 10
+
+
+def read_csv_rows(path):
+    """
+    Read a CSV file as a list of dicts.
+
+    :param path: Path to the CSV file, see `open_file`.
+    :return: List of dicts mapping column names to values, with their types
+        guessed.
+    """
+
+    with open_file(path, text=True) as csv_file:
+        return [row for row in guess_types(csv.DictReader(csv_file))]
+
+
+PREFETCH_PARSERS['.csv'] = read_csv_rows
+
 
 def downloaded_csv_file(filename, dicts=True):
     """
     Return the content of a downloaded CSV file as a list of dicts or lists.
 
-    :param filename: CSV filename.
+    :param filename: CSV filename. It can be compressed or a member of a ZIP
+        archive, e.g. `bundle.zip:orders.csv` (see `open_file`).
     :param dicts: whether to convert CSV rows to dicts; if False, the first
         row in the result is the header row.
     :return: List of dicts or lists with the content of the given file.
+
+    If the file was parsed in the background (see `prefetch_file`), the
+    result is reused.
     """
 
-    with open(wait_for_file(filename), 'r') as csv_file:
-        if dicts:
-            return [row for row in guess_types(csv.DictReader(csv_file))]
+    path = wait_for_file(filename)
+
+    if dicts:
+        return parse_file(read_csv_rows, path)
 
+    with open_file(path, text=True) as csv_file:
         return guess_types(csv.reader(csv_file))
 
 
@@ -95,16 +151,238 @@ def find_row(csv_rows, given_row):
     return None
 
 
-def check_for_rows_in_csv(csv_filename, given_rows):
+def record_boundaries(path, offsets):
+    """
+    Find where CSV records end, at or after the given offsets.
+
+    :param path: Path to an uncompressed CSV file.
+    :param offsets: Sorted list of byte offsets.
+    :return: Sorted list of byte offsets where a new record starts, without
+        duplicates. Offsets past the last record are dropped.
+
+    A line break only ends a record if it is not inside a quoted value, that is
+    when the number of quotes read so far is even. Quotes are counted block by
+    block, so splitting a file is mostly I/O.
+    """
+
+    boundaries = []
+    offsets = iter(offsets)
+    target = next(offsets, None)
+
+    # Whether the position being read is inside a quoted value.
+    quoted = False
+    block_offset = 0
+
+    with io.open(path, 'rb') as csv_file:
+        while target is not None:
+            block = csv_file.read(SPLIT_BLOCK_SIZE)
+
+            if not block:
+                break
+
+            position = 0
+
+            while target is not None and target < block_offset + len(block):
+                newline = block.find(
+                    b'\n', max(target - block_offset, position))
+
+                while newline != -1:
+                    quoted ^= bool(block.count(b'"', position, newline) % 2)
+                    position = newline
+
+                    if not quoted:
+                        break
+
+                    newline = block.find(b'\n', newline + 1)
+
+                if newline == -1:
+                    # The record ends in another block.
+                    break
+
+                boundary = block_offset + newline + 1
+                boundaries.append(boundary)
+
+                while target is not None and target < boundary:
+                    target = next(offsets, None)
+
+            quoted ^= bool(block.count(b'"', position) % 2)
+            block_offset += len(block)
+
+    return boundaries
+
+
+def match_csv_chunk(path, start, end, headers, given_rows):
+    """
+    Find the given rows in a chunk of a CSV file.
+
+    :param path: Path to an uncompressed CSV file.
+    :param start: Byte offset where the chunk starts, at a record boundary.
+    :param end: Byte offset where the chunk ends, at a record boundary.
+    :param headers: List of column names of the CSV file.
+    :param given_rows: A list of dictionaries containing the rows expected in
+        the csv.
+    :return: A tuple (list of the index in the chunk of the first row matching
+        each given row or None, number of rows in the chunk).
+
+    Run in a separate process by `find_rows_in_parallel`. The chunk is read
+    line by line, it is never held in memory.
+    """
+
+    with io.open(path, 'rb') as csv_file:
+        csv_file.seek(start)
+
+        reader = csv.DictReader(
+            chunk_lines(csv_file, end), fieldnames=headers)
+
+        # Count the rows read while matching; types are only guessed for those.
+        counter = itertools.count()
+        found = find_rows(
+            (guess_types(row) for row, __ in zip(reader, counter)),
+            given_rows,
+        )
+
+        return found, next(counter) + sum(1 for __ in reader)
+
+
+def chunk_lines(csv_file, end):
+    """
+    Read the lines of a binary file up to an offset.
+
+    :param csv_file: Binary file object, positioned at the start of a line.
+    :param end: Byte offset where reading stops, at a line boundary.
+    :return: A generator of the lines decoded as text, line breaks included.
+    """
+
+    encoding = locale.getpreferredencoding(False)
+
+    while csv_file.tell() < end:
+        line = csv_file.readline()
+
+        if not line:
+            return
+
+        yield line.decode(encoding)
+
+
+def parallel_executor():
+    """
+    Process pool matching rows of CSV files, see `PARALLEL_EXECUTOR`.
+
+    :return: A `ProcessPoolExecutor` with `PARALLEL_PROCESSES` workers.
+    """
+
+    global PARALLEL_EXECUTOR  # pylint:disable=global-statement
+    if PARALLEL_EXECUTOR is None:
+        PARALLEL_EXECUTOR = ProcessPoolExecutor(
+            max_workers=PARALLEL_PROCESSES or os.cpu_count() or 1)
+
+    return PARALLEL_EXECUTOR
+
+
+def find_rows_in_parallel(path, given_rows):
+    """
+    Find the given rows in a CSV file using several processes.
+
+    :param path: Path to the CSV file, see `open_file`.
+    :param given_rows: A list of dictionaries containing the rows expected in
+        the csv.
+    :return: A list with the index of the first row matching each given row,
+        or None for the given rows that were not found.
+
+    The file is split into one chunk per process at record boundaries. The
+    chunk results are merged in file order, so indices are the same as when
+    reading the file sequentially. Compressed files and archive members can't
+    be split and are read sequentially.
+    """
+
+    if (
+            split_archive_member(path)[1] is not None
+            or os.path.splitext(path)[1].lower() in DECOMPRESSORS
+    ):
+        return find_rows(downloaded_rows(path), given_rows)
+
+    processes = PARALLEL_PROCESSES or os.cpu_count() or 1
+    size = os.path.getsize(path)
+
+    # The first boundary is the end of the header row.
+    boundaries = record_boundaries(
+        path,
+        [0] + [size * index // processes for index in range(1, processes)],
+    )
+
+    if not boundaries:
+        return [None] * len(given_rows)
+
+    headers = csv_headers(path)
+    chunks = zip(boundaries, boundaries[1:] + [size])
+
+    executor = parallel_executor()
+    futures = [
+        executor.submit(match_csv_chunk, path, start, end, headers, given_rows)
+        for start, end in chunks
+        if start < end
+    ]
+
+    found = [None] * len(given_rows)
+    rows_before = 0
+
+    for future in futures:
+        chunk_found, chunk_rows = future.result()
+
+        for given_index, row_index in enumerate(chunk_found):
+            if found[given_index] is None and row_index is not None:
+                found[given_index] = rows_before + row_index
+
+        rows_before += chunk_rows
+
+    return found
+
+
+def downloaded_rows(path):
+    """
+    Read the rows of a CSV file one at a time.
+
+    :param path: Path to the CSV file, see `open_file`.
+    :return: A generator of dictionaries mapping column names to values, with
+        their types guessed.
+    """
+
+    with open_file(path, text=True) as csv_file:
+        for row in csv.DictReader(csv_file):
+            yield guess_types(row)
+
+
+def check_for_rows_in_csv(csv_filename, given_rows, parallel=False):
     """
     Check that the CSV contains the expected rows.
 
     :param csv_filename: CSV filename to check.
     :param given_rows: A list of dictionaries containing the
         rows expected in the csv.
+    :param parallel: Whether to match the rows using several processes, see
+        `find_rows_in_parallel`.
     :return: A list with the position of each row in the file.
     """
 
+    if parallel:
+        found = find_rows_in_parallel(wait_for_file(csv_filename), given_rows)
+
+        missing = [
+            given_row
+            for given_row, found_index in zip(given_rows, found)
+            if found_index is None
+        ]
+
+        assert_true(
+            not missing,
+            'CSV rows not found in {}:\n{}'.format(
+                csv_filename,
+                '\n'.join(str(given_row) for given_row in missing),
+            )
+        )
+
+        return found
+
     csv_rows = downloaded_csv_file(csv_filename)
 
     row_indices = []
@@ -126,38 +404,47 @@ def check_for_rows_in_csv(csv_filename, given_rows):
     return row_indices
 
 
-@step(r'Downloaded CSV file {STRING} should contain:$'.format(
-    STRING=CAPTURE_STRING,
-))
+@step(
+    r'Downloaded CSV file {STRING} should contain( in parallel)?:$'.format(
+        STRING=CAPTURE_STRING,
+    ))
 @wait_for
-def check_csv_file(self, filename):
+def check_csv_file(self, filename, parallel=None):
     """
     Check that the given data exists on the CSV file.
 
     :param self: Object reference to aloe.
     :param filename: Filename of the CSV file to verify.
+    :param parallel: When set, rows are matched using several processes.
+        Useful for very large files.
     :return: None.
     """
     assert self.table is not None, 'CSV content not specified'
 
-    check_for_rows_in_csv(filename, guess_types(self.hashes))
+    check_for_rows_in_csv(
+        filename, guess_types(self.hashes), parallel=bool(parallel))
 
 
-@step(r'Downloaded CSV file {STRING} should contain rows in order:$'.format(
-    STRING=CAPTURE_STRING,
-))
+@step(
+    r'Downloaded CSV file {STRING} should contain rows in order'
+    r'( in parallel)?:$'.format(
+        STRING=CAPTURE_STRING,
+    ))
 @wait_for
-def check_csv_file_in_order(self, filename):
+def check_csv_file_in_order(self, filename, parallel=None):
     """
     Check that the given data exists on the CSV file in the required order.
 
     :param self: Object reference to aloe.
     :param filename: Filename of the CSV file to verify.
+    :param parallel: When set, rows are matched using several processes.
+        Useful for very large files.
     :return: None.
     """
     assert self.table is not None, 'CSV content not specified'
 
-    row_indices = check_for_rows_in_csv(filename, guess_types(self.hashes))
+    row_indices = check_for_rows_in_csv(
+        filename, guess_types(self.hashes), parallel=bool(parallel))
 
     # Check that the rows are in the expected order
     assert_equal(
@@ -215,3 +502,222 @@ def check_csv_headers(self, filename):
     assert actual, "Downloaded CSV file has no data."
 
     assert_equal(expected, actual[0])
+
+
+def reference_file(filename):
+    """
+    Path to a reference file.
+
+    :param filename: Reference filename, relative to
+        `world.REFERENCE_FILES_DIR` if defined or to the current directory.
+        It can be compressed or a member of a ZIP archive (see `open_file`).
+    :return: Path to the reference file.
+    """
+
+    path = os.path.join(getattr(world, 'REFERENCE_FILES_DIR', ''), filename)
+
+    assert os.path.isfile(split_archive_member(path)[0]), (
+        "Reference file {path} not found.".format(
+            path=path,
+        ))
+
+    return path
+
+
+def csv_headers(path):
+    """
+    Read the header row of a CSV file.
+
+    :param path: Path to the CSV file.
+    :return: List of column names.
+    """
+
+    with open_file(path, text=True) as csv_file:
+        return next(csv.reader(csv_file), [])
+
+
+def csv_column_values(path, columns):
+    """
+    Read the values of some columns in a CSV file, one row at a time.
+
+    :param path: Path to the CSV file.
+    :param columns: List of column names to read, in the desired order.
+    :return: A generator of tuples with the values of each row. The header row
+        is skipped.
+    """
+
+    with open_file(path, text=True) as csv_file:
+        reader = csv.reader(csv_file)
+        headers = next(reader, [])
+        positions = [headers.index(column) for column in columns]
+
+        for row in reader:
+            yield tuple(
+                row[position] if position < len(row) else ''
+                for position in positions
+            )
+
+
+def row_digest(row):
+    """
+    Hash a CSV row to compare it without keeping it in memory.
+
+    :param row: Tuple of strings.
+    :return: Bytes digest of the row.
+    """
+
+    return hashlib.md5('\x00'.join(row).encode('utf-8')).digest()
+
+
+def diff_csv_in_order(path, reference_path, columns, limit):
+    """
+    Compare two CSV files row by row.
+
+    :param path: Path to the CSV file to check.
+    :param reference_path: Path to the expected CSV file.
+    :param columns: List of column names to compare.
+    :param limit: Maximum number of differences to return.
+    :return: List of strings describing the differences.
+    """
+
+    differences = []
+
+    rows = zip_longest(
+        csv_column_values(path, columns),
+        csv_column_values(reference_path, columns),
+    )
+
+    # Line 1 holds the headers.
+    for line, (row, expected_row) in enumerate(rows, 2):
+        if row == expected_row:
+            continue
+
+        differences.append(
+            'Line {line}: found {row}, expected {expected_row}'.format(
+                line=line,
+                row=row,
+                expected_row=expected_row,
+            ))
+
+        if len(differences) >= limit:
+            break
+
+    return differences
+
+
+def diff_csv_in_any_order(path, reference_path, columns, limit):
+    """
+    Compare two CSV files as multisets of rows.
+
+    :param path: Path to the CSV file to check.
+    :param reference_path: Path to the expected CSV file.
+    :param columns: List of column names to compare.
+    :param limit: Maximum number of differences to return.
+    :return: List of strings describing the differences.
+
+    Only a 16-byte digest and a count of each distinct row are kept in memory,
+    not the rows themselves, so memory grows with the number of distinct rows
+    (about 100 bytes each). Files are read a second time to report the
+    differing rows, only if there are any.
+    """
+
+    counts = defaultdict(int)
+
+    for row in csv_column_values(path, columns):
+        counts[row_digest(row)] += 1
+
+    for row in csv_column_values(reference_path, columns):
+        counts[row_digest(row)] -= 1
+
+    counts = {digest: count for digest, count in counts.items() if count}
+
+    if not counts:
+        return []
+
+    differences = []
+
+    for source, sign, message in (
+            (path, 1, 'Unexpected row: {row}'),
+            (reference_path, -1, 'Missing row: {row}'),
+    ):
+        for row in csv_column_values(source, columns):
+            if len(differences) >= limit:
+                return differences
+
+            digest = row_digest(row)
+
+            if counts.get(digest, 0) * sign > 0:
+                counts[digest] -= sign
+                differences.append(message.format(row=row))
+
+    return differences
+
+
+@step(
+    r'downloaded CSV file {STRING} should match reference file {STRING}'
+    r'( in any order)?(?: ignoring columns {STRING})?$'.format(
+        STRING=CAPTURE_STRING,
+    ))
+def check_csv_matches_reference(
+        self, filename, reference_filename, any_order, ignored_columns):
+    """
+    Check that a CSV file has the same content as a reference file.
+
+    :param self: Object reference to aloe. [Not used].
+    :param filename: Filename of the CSV file to verify.
+    :param reference_filename: Filename of the expected CSV file.
+    :param any_order: When set, the order of the rows is not checked.
+    :param ignored_columns: Comma separated names of columns not to compare.
+        [Optional]
+    :return: None.
+
+    Files are streamed, so they can be arbitrarily large. Values are compared
+    as text and columns are matched by name. Only the first
+    `MAX_REPORTED_DIFFERENCES` differing rows are reported.
+
+    Example:
+        Then downloaded CSV file "orders.csv" should match reference file
+        "reference/orders.csv" in any order ignoring columns "id, created"
+    """
+
+    path = wait_for_file(filename)
+    reference_path = reference_file(reference_filename)
+
+    ignored = set()
+    if ignored_columns:
+        ignored = {column.strip() for column in ignored_columns.split(',')}
+
+    columns = [
+        column
+        for column in csv_headers(reference_path)
+        if column not in ignored
+    ]
+    found_columns = [
+        column
+        for column in csv_headers(path)
+        if column not in ignored
+    ]
+
+    assert_equal(
+        sorted(found_columns),
+        sorted(columns),
+        "CSV file {filename} doesn't have the same columns as {reference}."
+        .format(
+            filename=filename,
+            reference=reference_filename,
+        ))
+
+    if any_order:
+        diff = diff_csv_in_any_order
+    else:
+        diff = diff_csv_in_order
+
+    differences = diff(path, reference_path, columns, MAX_REPORTED_DIFFERENCES)
+
+    assert not differences, (
+        "CSV file {filename} doesn't match {reference}:\n{differences}"
+        .format(
+            filename=filename,
+            reference=reference_filename,
+            differences='\n'.join(differences),
+        ))
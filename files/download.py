@@ -1,9 +1,170 @@
-"""Gherkin steps for downloading files."""
+"""
+Gherkin steps for downloading files.
+
+Downloads can be isolated per scenario by setting `world.ISOLATE_DOWNLOADS` to
+True. Each scenario then gets its own directory inside `world.DOWNLOAD_DIR`,
+grouped by worker process, so scenarios running in parallel don't collide:
+
+    DOWNLOAD_DIR/worker-<pid>/scenario-<random>/
+
+The directory is removed after the scenario. It requires the browser to share
+the filesystem with the tests (i.e. not a remote browser).
+
+If `world.PREFETCH_DOWNLOADS` is set to True, files found by
+`file "..." should be downloaded` are parsed in the background (see
+`prefetch_file`) while the following steps run. It only pays off when the
+steps that follow read the whole file, e.g. checking CSV rows without
+`in parallel` or all the pages of a PDF.
+"""
 from __future__ import unicode_literals
 
-from aloe import step
-from aloe_webdriver_extra.util import CAPTURE_STRING, NUMBER
-from .util import wait_for_file
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from aloe import after, before, step, world
+from aloe_webdriver_extra.util import CAPTURE_NUMBER, CAPTURE_STRING, NUMBER
+from .util import (
+    clear_prefetched,
+    existing_downloads,
+    file_digest,
+    file_size,
+    prefetch_file,
+    set_browser_download_dir,
+    wait_for_file,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Number of threads hashing the files of a manifest.
+HASH_WORKERS = 4
+
+
+def create_scenario_download_dir():
+    """
+    Create a download directory for the scenario and point the browser to it.
+    """
+
+    worker_dir = os.path.join(
+        world.DOWNLOAD_DIR,
+        'worker-{pid}'.format(pid=os.getpid()),
+    )
+
+    if not os.path.isdir(worker_dir):
+        os.makedirs(worker_dir)
+
+    scenario_dir = tempfile.mkdtemp(prefix='scenario-', dir=worker_dir)
+
+    if set_browser_download_dir(scenario_dir):
+        world.scenario_download_dir = scenario_dir
+    else:
+        logger.warning(
+            "The browser doesn't allow changing its download directory,"
+            " using %s for all the scenarios.",
+            world.DOWNLOAD_DIR,
+        )
+        shutil.rmtree(scenario_dir, ignore_errors=True)
+
+
+def isolate_downloads(scenario, *args):
+    """
+    Prepare the download directory of the scenario.
+
+    Files already in it when the scenario starts are older than its downloads.
+    """
+
+    world.downloads_checked = False
+    world.scenario_download_dir = None
+
+    if (
+            getattr(world, 'ISOLATE_DOWNLOADS', False)
+            and hasattr(world, 'DOWNLOAD_DIR')
+            and hasattr(world, 'browser')
+    ):
+        create_scenario_download_dir()
+
+    world.previous_downloads = existing_downloads()
+
+
+before.each_example(function=isolate_downloads, name='isolate_downloads')
+
+
+def remove_scenario_downloads(scenario, *args):
+    """
+    Remove the download directory of the scenario, if any.
+    """
+
+    scenario_dir = getattr(world, 'scenario_download_dir', None)
+
+    if scenario_dir:
+        world.scenario_download_dir = None
+        set_browser_download_dir(world.DOWNLOAD_DIR)
+        shutil.rmtree(scenario_dir, ignore_errors=True)
+
+
+after.each_example(
+    function=remove_scenario_downloads,
+    name='remove_scenario_downloads',
+)
+
+
+def forget_prefetched_files(scenario, *args):
+    """
+    Forget the files parsed in the background during the scenario.
+    """
+
+    clear_prefetched()
+
+
+after.each_example(
+    function=forget_prefetched_files,
+    name='forget_prefetched_files',
+)
+
+
+def record_existing_downloads(step_):
+    """
+    Record the files downloaded before a step that could trigger a download.
+    """
+
+    world.is_file_step = False
+
+    if getattr(world, 'downloads_checked', False):
+        world.step_downloads = existing_downloads()
+
+
+before.each_step(
+    function=record_existing_downloads,
+    name='record_existing_downloads',
+)
+
+
+def update_previous_downloads(step_):
+    """
+    Only consider files created by the step that could have triggered them.
+
+    That is the first step following the last one that inspected downloaded
+    files (by calling `wait_for_file`), e.g. a click on a link. The files that
+    existed before it, with the same modification time, are only used if no
+    newer file has the same name (see `find_downloaded_file`). Consecutive
+    steps inspecting files can check the same download.
+    """
+
+    if getattr(world, 'is_file_step', False):
+        world.downloads_checked = True
+    elif getattr(world, 'downloads_checked', False):
+        world.previous_downloads = getattr(world, 'step_downloads', {})
+        world.downloads_checked = False
+
+
+after.each_step(
+    function=update_previous_downloads,
+    name='update_previous_downloads',
+)
 
 
 @step(
@@ -21,6 +182,213 @@ def file_should_download(self, filename, seconds):
     :param seconds: Number of seconds to wait for the file to be downloaded.
         [Optional]
     :return: None.
+
+    Once downloaded, CSV and PDF files start being parsed in the background
+    for the steps checking their content if `world.PREFETCH_DOWNLOADS` is set.
+    XLSX files are not, their steps only read the sheets and cells they need.
+    """
+
+    path = wait_for_file(filename, seconds)
+
+    if getattr(world, 'PREFETCH_DOWNLOADS', False):
+        prefetch_file(path)
+
+
+def check_digest(path, algorithm, expected):
+    """
+    Compare the digest of a file with the expected one.
+
+    :param path: Path to the file, see `open_file`.
+    :param algorithm: Name of any algorithm supported by `hashlib`.
+    :param expected: Expected hexadecimal digest, case is ignored.
+    :return: An error message if the digests differ, otherwise None.
+
+    The bytes are hashed as downloaded, compressed files are not decompressed.
+    """
+
+    algorithm = algorithm.lower()
+
+    assert algorithm in hashlib.algorithms_available, (
+        "Unknown hash algorithm {algorithm}.".format(algorithm=algorithm)
+    )
+
+    digest = file_digest(path, algorithm, decompress=False)
+
+    if digest == expected.strip().lower():
+        return None
+
+    return "{algorithm} of {path} is {digest}, expected {expected}.".format(
+        algorithm=algorithm,
+        path=path,
+        digest=digest,
+        expected=expected,
+    )
+
+
+def check_size(path, min_size=None, max_size=None):
+    """
+    Check that the size of a file is within the given range.
+
+    :param path: Path to the file, see `open_file`.
+    :param min_size: Minimum size in bytes, inclusive. [Optional]
+    :param max_size: Maximum size in bytes, inclusive. [Optional]
+    :return: An error message if the size is out of range, otherwise None.
+    """
+
+    size = file_size(path)
+
+    if min_size is not None and size < min_size:
+        return "{path} is {size} bytes, expected at least {min_size}.".format(
+            path=path,
+            size=size,
+            min_size=min_size,
+        )
+
+    if max_size is not None and size > max_size:
+        return "{path} is {size} bytes, expected at most {max_size}.".format(
+            path=path,
+            size=size,
+            max_size=max_size,
+        )
+
+    return None
+
+
+@step(r'downloaded file {STRING} should have (\w+) {STRING}$'.format(
+    STRING=CAPTURE_STRING,
+))
+def check_file_digest(self, filename, algorithm, digest):
+    """
+    Check the checksum of a downloaded file.
+
+    :param self: Object reference to aloe. [Not used].
+    :param filename: Filename of the file to check.
+    :param algorithm: Name of any algorithm supported by `hashlib`, e.g.
+        `sha256` or `md5`.
+    :param digest: Expected hexadecimal digest.
+    :return: None.
+
+    The file is hashed in blocks, it is never read into memory at once.
+
+    Example:
+        Then downloaded file "logo.png" should have sha256 "9f86d0..."
+    """
+
+    error = check_digest(wait_for_file(filename), algorithm, digest)
+
+    assert error is None, error
+
+
+@step(
+    r'downloaded file {STRING} should be (at least|at most) {NUMBER}'
+    r' bytes$'.format(
+        STRING=CAPTURE_STRING,
+        NUMBER=CAPTURE_NUMBER,
+    ))
+def check_file_size_limit(self, filename, limit, size):
+    """
+    Check the minimum or maximum size of a downloaded file.
+
+    :param self: Object reference to aloe. [Not used].
+    :param filename: Filename of the file to check.
+    :param limit: Either `at least` or `at most`.
+    :param size: Size limit in bytes.
+    :return: None.
+    """
+
+    size = int(float(size))
+
+    if limit == 'at least':
+        error = check_size(wait_for_file(filename), min_size=size)
+    else:
+        error = check_size(wait_for_file(filename), max_size=size)
+
+    assert error is None, error
+
+
+@step(
+    r'downloaded file {STRING} should be between {NUMBER} and {NUMBER}'
+    r' bytes$'.format(
+        STRING=CAPTURE_STRING,
+        NUMBER=CAPTURE_NUMBER,
+    ))
+def check_file_size_range(self, filename, min_size, max_size):
+    """
+    Check that the size of a downloaded file is within a range.
+
+    :param self: Object reference to aloe. [Not used].
+    :param filename: Filename of the file to check.
+    :param min_size: Minimum size in bytes, inclusive.
+    :param max_size: Maximum size in bytes, inclusive.
+    :return: None.
     """
 
-    wait_for_file(filename, seconds)
+    error = check_size(
+        wait_for_file(filename),
+        min_size=int(float(min_size)),
+        max_size=int(float(max_size)),
+    )
+
+    assert error is None, error
+
+
+def check_manifest_entry(path, entry):
+    """
+    Check a downloaded file against a row of a manifest.
+
+    :param path: Path to the file, see `open_file`.
+    :param entry: Dictionary with optional `size`, `min size` and `max size`
+        columns and digests keyed by algorithm name.
+    :return: List of error messages.
+    """
+
+    errors = []
+    sizes = {}
+
+    for column, value in entry.items():
+        if not value:
+            continue
+
+        if column == 'size':
+            sizes['min_size'] = sizes['max_size'] = int(value)
+        elif column == 'min size':
+            sizes['min_size'] = int(value)
+        elif column == 'max size':
+            sizes['max_size'] = int(value)
+        else:
+            errors.append(check_digest(path, column, value))
+
+    if sizes:
+        errors.append(check_size(path, **sizes))
+
+    return [error for error in errors if error is not None]
+
+
+@step(r'downloaded files should match:$')
+def check_downloaded_files(self):
+    """
+    Check the checksums and sizes of several downloaded files.
+
+    :param self: Object reference to aloe.
+    :return: None.
+
+    Files are waited for in order and then hashed in parallel threads
+    (`HASH_WORKERS`). All the mismatches are reported together.
+
+    Example:
+        Then downloaded files should match:
+            | file        | sha256    | min size | max size |
+            | logo.png    | 9f86d0... |          |          |
+            | report.pdf  |           | 1000     | 200000   |
+    """
+
+    assert self.table is not None, 'Manifest not specified'
+
+    entries = [dict(entry) for entry in self.hashes]
+    paths = [wait_for_file(entry.pop('file')) for entry in entries]
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        results = executor.map(check_manifest_entry, paths, entries)
+        errors = [error for result in results for error in result]
+
+    assert not errors, '\n'.join(errors)
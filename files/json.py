@@ -0,0 +1,243 @@
+"""Gherkin steps to work with downloaded JSON and NDJSON files."""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import re
+
+from aloe import step
+from aloe.tools import guess_types
+from nose.tools import assert_equal
+
+from aloe_webdriver_extra.util import CAPTURE_STRING
+from .util import file_extension, find_rows, open_file, wait_for_file
+
+
+# Extensions of files containing a JSON document per line.
+NDJSON_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# Size in characters of the blocks read when parsing JSON arrays.
+READ_BLOCK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_ndjson(stream):
+    """
+    Parse a JSON document per line.
+
+    :param stream: Text file object.
+    :return: A generator of the parsed documents. Empty lines are skipped.
+    """
+
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+
+        if not line:
+            continue
+
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise AssertionError("Invalid JSON on line {line}: {error}".format(
+                line=line_number,
+                error=error,
+            ))
+
+
+def iter_json_array(stream):
+    """
+    Parse the elements of a JSON array one at a time.
+
+    :param stream: Text file object containing a JSON array.
+    :return: A generator of the parsed elements.
+
+    Only the element being parsed is kept in memory, not the whole array.
+    Elements must be separated by commas and nothing but whitespace can follow
+    the array, as with `json.load`. Content after the array is only checked if
+    all the elements are read.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    # What comes next: '[', the first element or ']', an element after a
+    # comma, or a comma or ']' after an element.
+    expected = 'start'
+
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+
+        if position == len(buffer):
+            buffer = stream.read(READ_BLOCK_SIZE)
+            position = 0
+
+            assert buffer, "Unexpected end of the JSON array."
+            continue
+
+        char = buffer[position]
+
+        if expected == 'start':
+            assert char == '[', "JSON file doesn't contain an array."
+            expected = 'first'
+            position += 1
+            continue
+
+        if char == ']' and expected in ('first', 'separator'):
+            position += 1
+            break
+
+        if expected == 'separator':
+            if char != ',':
+                raise ValueError(
+                    "Expected ',' or ']' in the JSON array, found {char!r}."
+                    .format(char=char))
+
+            expected = 'element'
+            position += 1
+            continue
+
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except ValueError as error:
+            element, end = error, None
+
+        if end is None or end == len(buffer):
+            # The element might continue in the next block. Read at least as
+            # much as there is already, so big elements are parsed in
+            # logarithmic attempts.
+            block = stream.read(max(READ_BLOCK_SIZE, len(buffer) - position))
+
+            if block:
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+
+            assert end is not None, "Invalid JSON: {error}".format(
+                error=element,
+            )
+
+        yield element
+
+        expected = 'separator'
+        position = end
+
+    while buffer:
+        if WHITESPACE.match(buffer, position).end() != len(buffer):
+            raise ValueError("Unexpected content after the JSON array.")
+
+        buffer = stream.read(READ_BLOCK_SIZE)
+        position = 0
+
+
+def flatten_record(record, prefix=''):
+    """
+    Convert a JSON object to a flat dictionary of strings.
+
+    :param record: Dictionary parsed from JSON.
+    :param prefix: Prefix for the keys, used for nested objects.
+    :return: A dictionary mapping keys to values converted to text as they
+        appear in JSON (e.g. `true`, `null`, `1.5`). Keys of nested objects are
+        joined with dots, e.g. `customer.name`.
+    """
+
+    flat = {}
+
+    for key, value in record.items():
+        name = prefix + key
+
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, name + '.'))
+        elif isinstance(value, type('')):
+            flat[name] = value
+        else:
+            flat[name] = json.dumps(value)
+
+    return flat
+
+
+def json_records(path):
+    """
+    Read the records of a JSON or NDJSON file one at a time.
+
+    :param path: Path to the file, see `open_file`.
+    :return: A generator of flat dictionaries (see `flatten_record`) with their
+        types guessed like the values in tables given in feature tests.
+
+    Files ending in `.jsonl` or `.ndjson`, or not starting with `[`, are read
+    line by line. Otherwise they must contain an array of objects.
+    """
+
+    ndjson = file_extension(path) in NDJSON_EXTENSIONS
+
+    if not ndjson:
+        with open_file(path, text=True) as json_file:
+            start = json_file.read(READ_BLOCK_SIZE).lstrip()[:1]
+
+        ndjson = start != '['
+
+    with open_file(path, text=True) as json_file:
+        if ndjson:
+            records = iter_ndjson(json_file)
+        else:
+            records = iter_json_array(json_file)
+
+        for record in records:
+            assert isinstance(record, dict), (
+                "JSON record is not an object: {record}".format(
+                    record=record,
+                ))
+
+            yield guess_types(flatten_record(record))
+
+
+@step(
+    r'downloaded (?:ND)?JSON file {STRING} should contain records'
+    r'( in order)?:$'.format(
+        STRING=CAPTURE_STRING,
+    ))
+def check_json_records(self, filename, in_order):
+    """
+    Check that the given records exist on a JSON or NDJSON file.
+
+    :param self: Object reference to aloe.
+    :param filename: Filename of the file to verify.
+    :param in_order: When set, the records must appear in the given order.
+    :return: None.
+
+    Columns support lookups (see `get_lookup_function`), nested keys are
+    separated by dots. The file is read incrementally until all the records
+    are found.
+
+    Example:
+        Then downloaded JSON file "orders.json" should contain records:
+            | id | customer.name__contains | paid  |
+            | 7  | Markel                  | true  |
+    """
+
+    assert self.table is not None, 'JSON content not specified'
+
+    given_rows = guess_types(self.hashes)
+
+    records = json_records(wait_for_file(filename))
+    try:
+        found = find_rows(records, given_rows)
+    finally:
+        records.close()
+
+    missing = [
+        given_row
+        for given_row, record_index in zip(given_rows, found)
+        if record_index is None
+    ]
+
+    assert not missing, 'JSON records not found in {filename}:\n{rows}'.format(
+        filename=filename,
+        rows='\n'.join(str(row) for row in missing),
+    )
+
+    if in_order:
+        assert_equal(
+            found,
+            sorted(found),
+            "Records found in JSON but not in the order specified."
+        )
@@ -2,32 +2,250 @@
 from __future__ import unicode_literals
 
 import platform
+import shutil
 import subprocess
 import tempfile
+import threading
 
 from aloe import step, world
 
-from .util import wait_for_file, which
+from aloe_webdriver_extra.util import CAPTURE_NUMBER, StringHelper
+from .util import (
+    PREFETCH_PARSERS,
+    file_digest,
+    open_file,
+    prefetched_future,
+    wait_for_file,
+    which,
+)
 
+# pylint:disable=ungrouped-imports
+try:
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.layout import LAParams, LTTextContainer
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
 
-@step(r'downloaded PDF file "(.*?)" should contain:$')
-def check_pdf_file(self, filename):
+    PDFMINER_IS_INSTALLED = True
+except ImportError:
+    # pdfminer.six is not installed, PDF files are inspected in the browser.
+    PDFMINER_IS_INSTALLED = False
+# pylint:enable=ungrouped-imports
+
+
+# Normalised text of the PDF pages already extracted, keyed by the SHA-256
+# digest of the file and then by page number.
+PAGES_TEXT_CACHE = {}
+
+# Notified whenever a page is added to `PAGES_TEXT_CACHE` or an extraction in
+# the background finishes.
+PAGES_EXTRACTED = threading.Condition()
+
+
+def notify_pages_extracted(*args):
     """
-    Assert the given PDF file contains all the strings in the given list.
+    Wake up the steps waiting for pages extracted in the background.
+    """
+
+    with PAGES_EXTRACTED:
+        PAGES_EXTRACTED.notify_all()
+
+
+def pdf_pages_text(path, page_number=None):
+    """
+    Extract the text of a PDF file page by page.
+
+    :param path: Path to the PDF file, see `open_file`.
+    :param page_number: 1-based number of the only page to extract. All the
+        pages are extracted if not set.
+    :return: A generator of tuples (page number, normalised text).
+
+    Pages are only parsed when the generator reaches them, so consumers can
+    stop early. The text of each page is cached by the file content, other
+    steps on the same file won't parse the pages again.
+
+    If the file is being parsed in the background (see `prefetch_file`), its
+    pages are taken from there as soon as each of them is ready instead of
+    being parsed twice.
+    """
+
+    pages_text = PAGES_TEXT_CACHE.setdefault(file_digest(path), {})
+
+    if page_number in pages_text:
+        yield page_number, pages_text[page_number]
+        return
+
+    first_page = page_number or 1
+
+    future = prefetched_future(extract_pdf_pages, path)
+
+    if future is not None:
+        future.add_done_callback(notify_pages_extracted)
+
+        while True:
+            with PAGES_EXTRACTED:
+                PAGES_EXTRACTED.wait_for(
+                    # pylint:disable=cell-var-from-loop
+                    lambda: first_page in pages_text or future.done())
+
+            if first_page not in pages_text:
+                break
+
+            yield first_page, pages_text[first_page]
+
+            if page_number is not None:
+                return
+
+            first_page += 1
+
+        if not future.cancelled() and future.exception() is None:
+            assert page_number is None, (
+                "PDF file doesn't have page {page}.".format(page=page_number)
+            )
+            return
+
+        # The file couldn't be parsed in the background, e.g. it was still
+        # being written. Parse the remaining pages here.
+
+    for number, text in parse_pdf_pages(
+            path, pages_text, page_number, first_page):
+        yield number, text
+
+
+def parse_pdf_pages(path, pages_text, page_number=None, first_page=1):
+    """
+    Parse the pages of a PDF file that are not cached yet.
+
+    :param path: Path to the PDF file, see `open_file`.
+    :param pages_text: Dictionary caching the text of the pages of the file by
+        page number, see `PAGES_TEXT_CACHE`.
+    :param page_number: 1-based number of the only page to extract. All the
+        pages are extracted if not set.
+    :param first_page: 1-based number of the first page to extract.
+    :return: A generator of tuples (page number, normalised text).
+    """
+
+    manager = PDFResourceManager()
+    device = PDFPageAggregator(manager, laparams=LAParams())
+    interpreter = PDFPageInterpreter(manager, device)
+
+    found = False
+
+    with open_file(path, seekable=True) as pdf_file:
+        # Pages before the first one are only located, not parsed. The
+        # document is not read past the requested page.
+        pages = PDFPage.get_pages(pdf_file, maxpages=page_number or 0)
+
+        for number, page in enumerate(pages, 1):
+            if number < first_page:
+                continue
+
+            found = True
+
+            if number not in pages_text:
+                interpreter.process_page(page)
+
+                text = StringHelper.normalize_text(''.join(
+                    element.get_text()
+                    for element in device.get_result()
+                    if isinstance(element, LTTextContainer)
+                ))
+
+                with PAGES_EXTRACTED:
+                    pages_text[number] = text
+                    PAGES_EXTRACTED.notify_all()
+
+            yield number, pages_text[number]
+
+            if number == page_number:
+                break
+
+    assert found or page_number is None, (
+        "PDF file doesn't have page {page}.".format(page=page_number)
+    )
+
+
+def extract_pdf_pages(path):
+    """
+    Extract the text of all the pages of a PDF file.
+
+    :param path: Path to the PDF file, see `open_file`.
+    :return: List of tuples (page number, normalised text).
+
+    Used to parse PDF files in the background, it fills `PAGES_TEXT_CACHE`
+    for `pdf_pages_text` page by page.
+    """
+
+    pages_text = PAGES_TEXT_CACHE.setdefault(file_digest(path), {})
+
+    return list(parse_pdf_pages(path, pages_text))
+
+
+if PDFMINER_IS_INSTALLED:
+    PREFETCH_PARSERS['.pdf'] = extract_pdf_pages
+
+
+def missing_pdf_text(path, texts, page_number=None):
+    """
+    Find which of the given texts are not in a PDF file.
+
+    :param path: Path to the PDF file.
+    :param texts: List of strings to look for.
+    :param page_number: 1-based number of the page to look in. All the pages
+        are used if not set.
+    :return: List of strings not found in the PDF file.
+
+    Whitespace is normalised both in the PDF and in the given strings, so line
+    breaks in the PDF don't matter. Pages are read in order and the search
+    stops as soon as all the texts are found. Texts split between two pages
+    are found as well.
+
+    It doesn't wait for the whole file to be parsed in the background, pages
+    are taken from there as soon as each of them is ready.
+    """
+
+    remaining = [
+        (text, StringHelper.normalize_text(text))
+        for text in texts
+    ]
+    overlap = max([len(normalized) for __, normalized in remaining] or [0])
+    previous_text = ''
+
+    for __, page_text in pdf_pages_text(path, page_number):
+        if previous_text:
+            page_text = previous_text + ' ' + page_text
+
+        remaining = [
+            (text, normalized)
+            for text, normalized in remaining
+            if normalized not in page_text
+        ]
+
+        if not remaining:
+            break
+
+        previous_text = page_text[-overlap:]
+
+    return [text for text, __ in remaining]
+
+
+def render_pdf_in_browser(self, path, texts, page_number=None):
+    """
+    Convert a PDF file to HTML and look for the given texts in the browser.
 
     :param self: Object reference to aloe.
-    :param filename: PDF filename.
+    :param path: Path to the PDF file.
+    :param texts: List of strings to look for.
+    :param page_number: 1-based number of the only page to convert. All the
+        pages are converted if not set.
     :return: None.
 
-    How it works:
-    Convert PDF file to html and loads it in the browser. This allows to use
-    the 'I should see' step and to take a screenshot if it fails.
-    At the end the browser is send back to the previous page.
+    This allows to use the 'I should see' step and to take a screenshot if it
+    fails. At the end the browser is send back to the previous page.
     """
 
     pdftohtml = 'pdftohtml'
 
-    assert self.table is not None, "PDF content not specified."
     assert which(pdftohtml), (
         "Can't find {program}, it is required for inspecting PDF"
         " files.".format(
@@ -35,13 +253,25 @@ def check_pdf_file(self, filename):
         )
     )
 
-    with tempfile.NamedTemporaryFile(suffix='.html') as output_file:
+    pages = []
+    if page_number is not None:
+        pages = ['-f', str(page_number), '-l', str(page_number)]
+
+    with \
+            tempfile.NamedTemporaryFile(suffix='.pdf') as pdf_file, \
+            tempfile.NamedTemporaryFile(suffix='.html') as output_file:
+        # The PDF might be compressed or inside an archive.
+        with open_file(path) as source:
+            shutil.copyfileobj(source, pdf_file)
+        pdf_file.flush()
+
         subprocess.check_call([
             pdftohtml,
             '-c',
             '-i',
             '-noframes',
-            wait_for_file(filename),
+        ] + pages + [
+            pdf_file.name,
             output_file.name,
         ])
 
@@ -58,8 +288,56 @@ def check_pdf_file(self, filename):
         # Open html file in browser.
         world.browser.get(output_file.name)
 
-        for (text,) in self.table:
+        for text in texts:
             self.behave_as('And I should see "{0}"'.format(text))
 
         # Go back to the previous window.
         world.browser.back()
+
+
+@step(
+    r'downloaded PDF(?: file)? "(.*?)"(?: page {NUMBER})?'
+    r' should contain:$'.format(
+        NUMBER=CAPTURE_NUMBER,
+    ))
+def check_pdf_file(self, filename, page_number=None):
+    """
+    Assert the given PDF file contains all the strings in the given list.
+
+    :param self: Object reference to aloe.
+    :param filename: PDF filename.
+    :param page_number: 1-based number of the page that should contain the
+        strings. [Optional]
+    :return: None.
+
+    How it works:
+    The text of the PDF is extracted with `pdfminer.six` page by page until all
+    the strings are found, the browser is not used.
+    If `pdfminer.six` is not installed, or `world.DEBUG_PDF_IN_BROWSER` is set
+    and some strings are missing, the PDF is converted to HTML and loaded in
+    the browser instead (see `render_pdf_in_browser`).
+    """
+
+    assert self.table is not None, "PDF content not specified."
+
+    if page_number is not None:
+        page_number = int(page_number)
+
+    texts = [text for (text,) in self.table]
+    path = wait_for_file(filename)
+
+    if not PDFMINER_IS_INSTALLED:
+        render_pdf_in_browser(self, path, texts, page_number)
+        return
+
+    missing = missing_pdf_text(path, texts, page_number)
+
+    if missing and getattr(world, 'DEBUG_PDF_IN_BROWSER', False):
+        render_pdf_in_browser(self, path, texts, page_number)
+
+    assert not missing, (
+        "PDF file {filename} doesn't contain:\n{missing}".format(
+            filename=filename,
+            missing='\n'.join(missing),
+        )
+    )
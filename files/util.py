@@ -1,12 +1,63 @@
 """Utilities for working with downloaded files."""
 from __future__ import unicode_literals
 
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import operator
 import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 
 from aloe import world
-from nose.tools import assert_true
+from selenium.common.exceptions import WebDriverException
 
-from aloe_webdriver_extra.util import wait_for
+from aloe_webdriver_extra.util import (
+    StringHelper,
+    get_lookup_function,
+    wait_for,
+)
+
+
+# Lookup functions behaving as equality, rows using them can be found through
+# a hash index.
+EXACT_LOOKUPS = (operator.__eq__, StringHelper.equals)
+
+# Separates the path of a ZIP archive from the name of one of its members,
+# e.g. `bundle.zip:orders.csv`.
+ARCHIVE_MEMBER_SEPARATOR = ':'
+
+# Streams decompressing files, by extension.
+DECOMPRESSORS = {
+    '.bz2': bz2.BZ2File,
+    '.gz': lambda stream: gzip.GzipFile(fileobj=stream),
+    '.xz': lzma.LZMAFile,
+}
+
+# Functions parsing downloaded files in the background, keyed by file
+# extension. Each module handling a type of file registers its own.
+PREFETCH_PARSERS = {}
+
+# Files bigger than this (in bytes) are not parsed in the background, the steps
+# stream them instead of keeping their whole content in memory.
+PREFETCH_MAX_SIZE = 100 * 1024 * 1024
+
+# Number of threads parsing files in the background.
+PREFETCH_WORKERS = 2
+
+# Thread pool parsing the files, created on first use.
+PREFETCH_EXECUTOR = None
+
+# Futures of the files being parsed in the background, keyed by parser, path,
+# modification time and size.
+PREFETCHED = {}
+
+# Size in bytes of the blocks read when hashing files.
+HASH_CHUNK_SIZE = 1024 * 1024
 
 
 def which(program):
@@ -45,13 +96,424 @@ def which(program):
     return None
 
 
+def split_archive_member(path):
+    """
+    Split a path into the path of a ZIP archive and the name of a member.
+
+    :param path: Path to a file or to a member of a ZIP archive, e.g.
+        `bundle.zip:orders.csv`.
+    :return: A tuple (path to the file, name of the member). The name of the
+        member is None if the path doesn't refer to a ZIP archive member.
+    """
+
+    archive, separator, member = path.rpartition(ARCHIVE_MEMBER_SEPARATOR)
+
+    if separator and archive.lower().endswith('.zip'):
+        return archive, member
+
+    return path, None
+
+
+@contextmanager
+def open_file(path, text=False, seekable=False, decompress=True):
+    """
+    Open a file, a compressed file or a member of a ZIP archive as a stream.
+
+    :param path: Path to the file. Members of ZIP archives are referenced as
+        `path/to/bundle.zip:orders.csv`.
+    :param text: Whether to decode the content as text, otherwise the stream
+        returns bytes.
+    :param seekable: Whether the stream will be accessed randomly. Compressed
+        content is then read into memory, seeking backwards in a decompressing
+        stream means decompressing it again from the beginning.
+    :param decompress: Whether to decompress files by their extension.
+    :return: A context manager returning a file object.
+
+    Files ending in `.gz`, `.bz2` or `.xz` (including archive members) are
+    decompressed while being read, unless `decompress` is False. Only the
+    requested member of an archive is read, the archive is never extracted.
+    """
+
+    path, member = split_archive_member(path)
+
+    with ExitStack() as stack:
+        if member is None:
+            name = path
+            stream = stack.enter_context(io.open(path, 'rb'))
+        else:
+            name = member
+            archive = stack.enter_context(zipfile.ZipFile(path))
+
+            assert member in archive.namelist(), (
+                "{member} not found in {archive}. Available files: {members}"
+                .format(
+                    member=member,
+                    archive=path,
+                    members=', '.join(archive.namelist()),
+                ))
+
+            stream = stack.enter_context(archive.open(member))
+
+        decompressor = None
+        if decompress:
+            decompressor = DECOMPRESSORS.get(
+                os.path.splitext(name)[1].lower())
+
+        if decompressor is not None:
+            stream = stack.enter_context(decompressor(stream))
+
+        if seekable and (member is not None or decompressor is not None):
+            stream = io.BytesIO(stream.read())
+
+        if text:
+            stream = stack.enter_context(io.TextIOWrapper(stream, newline=''))
+
+        yield stream
+
+
+def file_digest(path, algorithm='sha256', decompress=True):
+    """
+    Hash the content of a file without reading it all into memory.
+
+    :param path: Path to the file, see `open_file`.
+    :param algorithm: Name of any algorithm supported by `hashlib`.
+    :param decompress: Whether to hash the decompressed content of compressed
+        files, otherwise the bytes as downloaded are hashed.
+    :return: Hexadecimal digest of the file content.
+    """
+
+    digest = hashlib.new(algorithm)
+
+    with open_file(path, decompress=decompress) as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def file_size(path):
+    """
+    Size of a file as downloaded, without decompressing it.
+
+    :param path: Path to the file, see `open_file`.
+    :return: Size in bytes. For ZIP archive members, their uncompressed size.
+    """
+
+    path, member = split_archive_member(path)
+
+    if member is None:
+        return os.path.getsize(path)
+
+    with zipfile.ZipFile(path) as archive:
+        try:
+            return archive.getinfo(member).file_size
+        except KeyError:
+            raise AssertionError("{member} not found in {archive}.".format(
+                member=member,
+                archive=path,
+            ))
+
+
+def file_extension(path):
+    """
+    Extension of a file, ignoring compression.
+
+    :param path: Path to the file, see `open_file`.
+    :return: Lowercase extension, e.g. `.csv` for `bundle.zip:orders.csv.gz`.
+    """
+
+    path, member = split_archive_member(path)
+    stem, extension = os.path.splitext((member or path).lower())
+
+    if extension in DECOMPRESSORS:
+        extension = os.path.splitext(stem)[1]
+
+    return extension
+
+
+def prefetch_key(parser, path):
+    """
+    Key identifying the result of parsing a file.
+
+    :param parser: Function parsing the file.
+    :param path: Path to the file, see `open_file`.
+    :return: A tuple, it changes if the file is modified.
+    """
+
+    stat = os.stat(split_archive_member(path)[0])
+
+    return (parser, path, stat.st_mtime, stat.st_size)
+
+
+def prefetch_file(path):
+    """
+    Start parsing a downloaded file in the background.
+
+    :param path: Path to the file, see `open_file`.
+    :return: None.
+
+    The parser is chosen by the file extension from `PREFETCH_PARSERS`. Steps
+    get the result through `parse_file` or `prefetched_result` instead of
+    parsing the file again, so parsing overlaps with the steps in between.
+    """
+
+    parser = PREFETCH_PARSERS.get(file_extension(path))
+
+    if (
+            parser is None
+            or os.path.getsize(split_archive_member(path)[0])
+            > PREFETCH_MAX_SIZE
+    ):
+        return
+
+    global PREFETCH_EXECUTOR  # pylint:disable=global-statement
+    if PREFETCH_EXECUTOR is None:
+        PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+
+    key = prefetch_key(parser, path)
+
+    if key not in PREFETCHED:
+        PREFETCHED[key] = PREFETCH_EXECUTOR.submit(parser, path)
+
+
+def prefetched_future(parser, path):
+    """
+    Future of parsing a file in the background.
+
+    :param parser: Function parsing the file.
+    :param path: Path to the file, see `open_file`.
+    :return: The future of `parser(path)` if it was started by `prefetch_file`,
+        otherwise None.
+    """
+
+    return PREFETCHED.get(prefetch_key(parser, path))
+
+
+def prefetched_result(parser, path):
+    """
+    Result of parsing a file in the background.
+
+    :param parser: Function parsing the file.
+    :param path: Path to the file, see `open_file`.
+    :return: The result of `parser(path)` if it was started by
+        `prefetch_file`, waiting for it if still running. None otherwise, or
+        if it failed.
+    """
+
+    future = prefetched_future(parser, path)
+
+    if future is None:
+        return None
+
+    try:
+        return future.result()
+    except Exception:  # pylint:disable=broad-except
+        # The file might have been incomplete, let the step parse it again.
+        return None
+
+
+def parse_file(parser, path):
+    """
+    Parse a file, reusing the result of parsing it in the background if any.
+
+    :param parser: Function parsing the file.
+    :param path: Path to the file, see `open_file`.
+    :return: The result of `parser(path)`.
+    """
+
+    result = prefetched_result(parser, path)
+
+    if result is None:
+        result = parser(path)
+
+    return result
+
+
+def clear_prefetched():
+    """
+    Forget the files parsed in the background, cancelling pending ones.
+
+    :return: None.
+    """
+
+    for future in PREFETCHED.values():
+        future.cancel()
+
+    PREFETCHED.clear()
+
+
+def download_dir():
+    """
+    Directory where the browser saves the downloaded files.
+
+    :return: The directory of the current scenario if downloads are isolated
+        (see `set_browser_download_dir`), otherwise `world.DOWNLOAD_DIR`.
+
+    It is expected that `DOWNLOAD_DIR` is defined in `aloe.world`.
+    """
+
+    assert hasattr(world, 'DOWNLOAD_DIR'), (
+        "`DOWNLOAD_DIR` must be defined in `aloe.world` in order to use any"
+        " step related to files downloaded with the browser."
+    )
+
+    return getattr(world, 'scenario_download_dir', None) or world.DOWNLOAD_DIR
+
+
+def set_browser_download_dir(path):
+    """
+    Change the directory where the browser saves the downloaded files.
+
+    :param path: Directory for the downloaded files.
+    :return: True if the browser accepted the new directory, False if it isn't
+        supported by the current driver.
+
+    Chrome is updated through the DevTools protocol and Firefox through its
+    preferences, other browsers keep the directory they were started with.
+    """
+
+    browser = world.browser
+
+    try:
+        if hasattr(browser, 'execute_cdp_cmd'):
+            browser.execute_cdp_cmd('Page.setDownloadBehavior', {
+                'behavior': 'allow',
+                'downloadPath': path,
+            })
+            return True
+
+        if hasattr(browser, 'CONTEXT_CHROME'):
+            with browser.context(browser.CONTEXT_CHROME):
+                browser.execute_script(
+                    'Services.prefs.setIntPref('
+                    '"browser.download.folderList", 2);'
+                    'Services.prefs.setStringPref('
+                    '"browser.download.dir", arguments[0]);',
+                    path,
+                )
+            return True
+    except WebDriverException:
+        pass
+
+    return False
+
+
+def existing_downloads():
+    """
+    Files currently in the download directory.
+
+    :return: A dictionary mapping the path of each file to its modification
+        time. Empty if there is no download directory.
+    """
+
+    if not hasattr(world, 'DOWNLOAD_DIR'):
+        return {}
+
+    directory = download_dir()
+
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return {}
+
+    files = {}
+
+    for name in names:
+        path = os.path.join(directory, name)
+
+        try:
+            files[path] = os.path.getmtime(path)
+        except OSError:
+            # Removed meanwhile, e.g. a temporary file.
+            pass
+
+    return files
+
+
+def find_downloaded_file(filename):
+    """
+    Find the latest download saved with the given filename.
+
+    :param filename: Filename of the expected file without any path.
+    :return: Full path of the file or None if it hasn't been downloaded yet.
+
+    Browsers don't overwrite existing files, a second download of `report.csv`
+    is saved as `report (1).csv` or `report(1).csv` instead. The most recent
+    of those files is returned.
+
+    Files in `world.previous_downloads` (those existing before the step that
+    triggered the download, see `files.download`) are only returned if none of
+    the files has been created or modified since, otherwise they are stale even
+    if their modification time is the same. Files still being written by
+    Firefox (with a `.part` companion) are ignored.
+    """
+
+    directory, basename = os.path.split(
+        os.path.join(download_dir(), filename))
+    stem, extension = os.path.splitext(basename)
+
+    pattern = re.compile(r'{stem}(?: ?\(\d+\))?{extension}$'.format(
+        stem=re.escape(stem),
+        extension=re.escape(extension),
+    ))
+    previous = getattr(world, 'previous_downloads', None) or {}
+
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+
+    candidates = []
+
+    for name in names:
+        path = os.path.join(directory, name)
+
+        if (
+                not pattern.match(name)
+                or not os.path.isfile(path)
+                or os.path.exists(path + '.part')
+        ):
+            continue
+
+        modified = os.path.getmtime(path)
+        is_new = previous.get(path) != modified
+
+        candidates.append((is_new, modified, path))
+
+    if not candidates:
+        return None
+
+    return max(candidates)[-1]
+
+
+@wait_for
+def assert_file_downloaded(filename):
+    """
+    Assert the file has been downloaded.
+
+    :param filename: Filename of the expected file without any path.
+    :return: Full path of the downloaded file.
+    """
+
+    path = find_downloaded_file(filename)
+
+    assert path, "File '{filename}' has not been downloaded to {dir}".format(
+        filename=filename,
+        dir=download_dir(),
+    )
+
+    return path
+
+
 def wait_for_file(filename, timeout=None):
     """
     Asserts the file exists otherwise waits for it to be downloaded.
 
-    :param filename: Filename of the expected file without any path
+    :param filename: Filename of the expected file without any path. It can
+        refer to a member of a ZIP archive, e.g. `bundle.zip:orders.csv`.
     :param timeout: Time in seconds to wait for the download. Default 5 seconds
-    :returns Full path of the downloaded file.
+    :returns Full path of the downloaded file, including the archive member if
+        any (see `open_file`).
 
     It is expected that `DOWNLOAD_DIR` is defined in `aloe.world`.
     """
@@ -59,14 +521,113 @@ def wait_for_file(filename, timeout=None):
     if timeout is None:
         timeout = 5
 
-    assert hasattr(world, 'DOWNLOAD_DIR'), (
-        "`DOWNLOAD_DIR` must be defined in `aloe.world` in order to use any"
-        " step related to files downloaded with the browser."
-    )
+    # Steps looking at downloaded files don't trigger new downloads, files
+    # created before them are still valid for the following steps.
+    world.is_file_step = True
+
+    filename, member = split_archive_member(filename)
+    path = assert_file_downloaded(filename, timeout=int(timeout))
+
+    if member is not None:
+        path = ARCHIVE_MEMBER_SEPARATOR.join((path, member))
+
+    return path
+
+
+def row_conditions(given_row):
+    """
+    Split a row given in a feature test into conditions.
+
+    :param given_row: A dictionary mapping column names (with optional string
+        compare functions affixed with '__') to values.
+    :return: A list of tuples (column name, lookup function, value).
+    """
+
+    conditions = []
+
+    for table_header, value in given_row.items():
+        lookup_function, column_name = get_lookup_function(table_header)
+        conditions.append((column_name, lookup_function, value))
+
+    return conditions
+
+
+def find_rows(rows, given_rows):
+    """
+    Find the rows given in a feature test in a single pass over other rows.
+
+    :param rows: An iterable of dictionaries mapping column names to values.
+        It is iterated only once and it can be a generator; iteration stops as
+        soon as all the given rows are found.
+    :param given_rows: A list of dictionaries mapping column names (with
+        optional string compare functions affixed with '__') to values.
+    :return: A list with the index of the first row matching each given row,
+        or None for the given rows that were not found.
+
+    Given rows are indexed by the values of their exact-match columns, so each
+    row is only compared with the given rows sharing those values. Given rows
+    using only other lookups (e.g. `__contains`) are compared with every row.
+    """
+
+    if not given_rows:
+        return []
+
+    conditions = [row_conditions(given_row) for given_row in given_rows]
+    found = [None] * len(given_rows)
+
+    # Exact-match column names -> values -> indices of given rows.
+    indexes = {}
+    unindexed = []
+
+    for given_index, given_conditions in enumerate(conditions):
+        exact = sorted(
+            [
+                (column_name, value)
+                for column_name, lookup_function, value in given_conditions
+                if lookup_function in EXACT_LOOKUPS
+            ],
+            key=operator.itemgetter(0),
+        )
+        columns = tuple(column_name for column_name, __ in exact)
+        key = tuple(value for __, value in exact)
+
+        if columns:
+            try:
+                indexes.setdefault(columns, {}).setdefault(key, []).append(
+                    given_index)
+                continue
+            except TypeError:
+                # Values that can't be hashed, e.g. lists.
+                pass
+
+        unindexed.append(given_index)
+
+    remaining = len(given_rows)
+
+    for row_index, row in enumerate(rows):
+        candidates = list(unindexed)
+
+        for columns, index in indexes.items():
+            try:
+                key = tuple(row[column_name] for column_name in columns)
+                candidates.extend(index.get(key, ()))
+            except (KeyError, TypeError):
+                continue
+
+        for given_index in candidates:
+            if found[given_index] is not None:
+                continue
+
+            if all(
+                    column_name in row
+                    and lookup_function(value, row[column_name])
+                    for column_name, lookup_function, value
+                    in conditions[given_index]
+            ):
+                found[given_index] = row_index
+                remaining -= 1
 
-    filename = os.path.join(world.DOWNLOAD_DIR, filename)
-    wait_for(
-        lambda: assert_true(os.path.isfile(filename))
-    )(timeout=int(timeout))
+        if not remaining:
+            break
 
-    return filename
+    return found
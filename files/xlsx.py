@@ -6,7 +6,161 @@ from aloe.tools import guess_types
 from nose.tools import assert_equal
 
 from aloe_webdriver_extra.util import CAPTURE_STRING
-from .util import wait_for_file
+from .util import find_rows, open_file, wait_for_file
+
+
+def load_xlsx_workbook(xlsx_file):
+    """
+    Open an XLSX file in read-only mode.
+
+    :param xlsx_file: Binary file object with the XLSX content.
+    :return: An OpenPyXL read-only workbook, it must be closed after use.
+
+    Sheets are only parsed when their rows are iterated, styles are not loaded
+    at all.
+    """
+
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        assert False, "OpenPyXL is required for analysing XLSX files."
+
+    return load_workbook(filename=xlsx_file, read_only=True)
+
+
+def xlsx_sheet_name(sheetnames, sheetname=None):
+    """
+    Check that a sheet exists.
+
+    :param sheetnames: List of the sheet names in a workbook.
+    :param sheetname: Name of the sheet. If None, the first sheet is used.
+    :return: The name of the sheet.
+    """
+
+    if sheetname is None:
+        return sheetnames[0]
+
+    assert sheetname in sheetnames, (
+        'Sheet "{sheet_name}" not found. Available sheets: {sheets}'.format(
+            sheet_name=sheetname,
+            sheets=', '.join(sheetnames),
+        )
+    )
+
+    return sheetname
+
+
+def get_xlsx_sheet(workbook, sheetname=None):
+    """
+    Get a sheet from a workbook by name.
+
+    :param workbook: An OpenPyXL workbook.
+    :param sheetname: Name of the sheet. If None, the first sheet is returned.
+    :return: An OpenPyXL worksheet.
+    """
+
+    return workbook[xlsx_sheet_name(workbook.sheetnames, sheetname)]
+
+
+def rows_as_dicts(rows):
+    """
+    Convert rows to dictionaries, using the first row as headers.
+
+    :param rows: An iterator of tuples of values.
+    :return: A generator of dictionaries mapping headers to values.
+    """
+
+    headers = next(rows, ())
+
+    for row in rows:
+        yield dict(zip(headers, row))
+
+
+def read_xlsx_cells(path, cells):
+    """
+    Read the values of several cells from an XLSX file.
+
+    :param path: Path to the XLSX file, see `open_file`.
+    :param cells: A dictionary mapping sheet names (None for the first sheet)
+        to lists of cell coordinates, e.g. {'Sheet1': ['A1', 'B18']}.
+    :return: A dictionary mapping (sheet name, coordinate) to the value of the
+        cell. Cells outside the used range of the sheet are None.
+
+    Only the given sheets are read, each of them in a single pass over the rows
+    spanning the requested cells.
+    """
+
+    try:
+        from openpyxl.utils.cell import coordinate_to_tuple
+    except ImportError:
+        assert False, "OpenPyXL is required for analysing XLSX files."
+
+    values = {}
+
+    with open_file(path, seekable=True) as xlsx_file:
+        workbook = load_xlsx_workbook(xlsx_file)
+
+        try:
+            for sheetname, coordinates in cells.items():
+                sheet = get_xlsx_sheet(workbook, sheetname)
+
+                positions = {
+                    coordinate_to_tuple(coordinate): coordinate
+                    for coordinate in coordinates
+                }
+                values.update(
+                    ((sheetname, coordinate), None)
+                    for coordinate in coordinates
+                )
+
+                row_numbers = [row for row, __ in positions]
+                column_numbers = [column for __, column in positions]
+
+                min_row = min(row_numbers)
+                min_column = min(column_numbers)
+
+                rows = sheet.iter_rows(
+                    min_row=min_row,
+                    max_row=max(row_numbers),
+                    min_col=min_column,
+                    max_col=max(column_numbers),
+                    values_only=True,
+                )
+
+                for row_number, row in enumerate(rows, min_row):
+                    for column_number, value in enumerate(row, min_column):
+                        coordinate = positions.get(
+                            (row_number, column_number))
+
+                        if coordinate is not None:
+                            values[(sheetname, coordinate)] = value
+        finally:
+            workbook.close()
+
+    return values
+
+
+def xlsx_sheet_rows(path, sheetname=None):
+    """
+    Read the rows of an XLSX sheet one at a time.
+
+    :param path: Path to the XLSX file, see `open_file`.
+    :param sheetname: Name of the sheet. If None, the first sheet is used.
+    :return: A generator of dictionaries mapping the values in the first row
+        of the sheet (headers) to the values in each of the following rows.
+    """
+
+    with open_file(path, seekable=True) as xlsx_file:
+        workbook = load_xlsx_workbook(xlsx_file)
+
+        try:
+            rows = get_xlsx_sheet(workbook, sheetname).iter_rows(
+                values_only=True)
+
+            for row in rows_as_dicts(rows):
+                yield row
+        finally:
+            workbook.close()
 
 
 @step(
@@ -28,19 +182,13 @@ def check_xlsx_file(self, filename, sheetname=None):
         | value | value      |
     """
 
-    try:
-        from openpyxl import load_workbook
-    except ImportError:
-        assert False, "OpenPyXL is required for analysing XLSX files."
-
     assert self.table is not None, 'XLSX content not specified'
 
-    workbook = load_workbook(filename=wait_for_file(filename))
-    first_sheet = workbook.get_sheet_names()[0]
+    expected = []
 
     for row in guess_types(self.hashes):
         for cell_coords, value in row.items():
-            cell_sheetname = None
+            cell_sheetname = sheetname
 
             if ':' in cell_coords:
                 assert sheetname is None, (
@@ -48,29 +196,69 @@ def check_xlsx_file(self, filename, sheetname=None):
                 )
 
                 cell_sheetname, cell_coords = cell_coords.split(':')
-            elif sheetname:
-                cell_sheetname = sheetname
-
-            if cell_sheetname:
-                sheet = workbook.get_sheet_by_name(cell_sheetname)
-
-                assert sheet is not None, (
-                    'Sheet "{sheet_name}" not found. Available sheets: '
-                    '{sheets}'
-                ).format(
-                    sheet_name=cell_sheetname,
-                    sheets=', '.join(workbook.get_sheet_names())
-                )
-            else:
-                sheet = first_sheet
-
-            cell_value = sheet.cell(cell_coords).value
-            assert_equal(
-                cell_value,
-                value,
-                'Value [{value}] does not match expected value in cell '
-                '{cell}'.format(
-                    value=cell_value,
-                    cell=cell_coords,
-                )
+
+            expected.append((cell_sheetname, cell_coords, value))
+
+    cells = {}
+    for cell_sheetname, cell_coords, __ in expected:
+        cells.setdefault(cell_sheetname, []).append(cell_coords)
+
+    values = read_xlsx_cells(wait_for_file(filename), cells)
+
+    for cell_sheetname, cell_coords, value in expected:
+        cell_value = values.get((cell_sheetname, cell_coords))
+        assert_equal(
+            cell_value,
+            value,
+            'Value [{value}] does not match expected value in cell '
+            '{cell}'.format(
+                value=cell_value,
+                cell=cell_coords,
             )
+        )
+
+
+@step(
+    r'downloaded XLSX file {STRING}(?: (?:in )?sheet {STRING})? should'
+    r' contain rows:$'.format(
+        STRING=CAPTURE_STRING,
+    ))
+def check_xlsx_rows(self, filename, sheetname=None):
+    """
+    Check that the given rows exist on a sheet of the XLSX file.
+
+    :param self: Object reference to aloe.
+    :param filename: Filename of the XLSX file to verify.
+    :param sheetname: Name of the sheet to use. If none is specified then the
+        first one will be used.
+
+    The first row of the sheet is used as headers. Columns support lookups
+    (see `get_lookup_function`) and can be a subset of the sheet columns.
+
+    Example:
+        Then downloaded XLSX file "report.xlsx" sheet "Data" should contain
+        rows:
+            | Name__contains | Age |
+            | Markel         | 50  |
+    """
+
+    assert self.table is not None, 'XLSX content not specified'
+
+    given_rows = guess_types(self.hashes)
+
+    rows = xlsx_sheet_rows(wait_for_file(filename), sheetname)
+    try:
+        found = find_rows(rows, given_rows)
+    finally:
+        rows.close()
+
+    missing = [
+        given_row
+        for given_row, row_index in zip(given_rows, found)
+        if row_index is None
+    ]
+
+    assert not missing, 'XLSX rows not found in {filename}:\n{rows}'.format(
+        filename=filename,
+        rows='\n'.join(str(row) for row in missing),
+    )
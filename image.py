@@ -1,16 +1,143 @@
 """Gherkin steps related with images."""
 from __future__ import unicode_literals
 
-from aloe import step
+import io
+import json
+import os
+
+from aloe import step, world
 
 from aloe_webdriver_extra.util import (
     CAPTURE_NUMBER,
     CAPTURE_OPTIONAL_POSITION,
     CAPTURE_STRING,
-    find_visible_elements_by_xpath,
     nth_element,
+    wait_for,
 )
 
+# pylint:disable=ungrouped-imports
+try:
+    import numpy
+
+    NUMPY_IS_INSTALLED = True
+except ImportError:
+    # NumPy is not installed, pixels are compared with Pillow instead.
+    NUMPY_IS_INSTALLED = False
+# pylint:enable=ungrouped-imports
+
+
+# Maximum number of different bits between the perceptual hashes of two images
+# for them to be considered the same without comparing their pixels.
+PERCEPTUAL_HASH_THRESHOLD = 0
+
+# Maximum difference of a colour channel (0-255) for a pixel to be considered
+# unchanged.
+PIXEL_TOLERANCE = 16
+
+# Maximum fraction of changed pixels for an image to match its baseline.
+CHANGED_PIXELS_TOLERANCE = 0.001
+
+# File in the baselines directory caching the perceptual hash of each baseline,
+# along with its modification time and size.
+BASELINE_HASHES_FILENAME = 'baseline_hashes.json'
+
+
+# Script finding the visible images whose URL ends with the given path. Returns
+# the images and whether each of them has loaded (i.e. it is not broken).
+FIND_IMAGES_SCRIPT = """
+    var path = arguments[0];
+    var images = [];
+    var loaded = [];
+
+    function isDisplayed(image) {
+        if (!image.getClientRects().length) {
+            return false;
+        }
+
+        if (window.getComputedStyle(image).visibility !== 'visible') {
+            return false;
+        }
+
+        for (var element = image; element; element = element.parentElement) {
+            if (window.getComputedStyle(element).opacity === '0') {
+                return false;
+            }
+        }
+
+        return true;
+    }
+
+    for (var i = 0; i < document.images.length; i++) {
+        var image = document.images[i];
+        var source = image.src;
+
+        if (
+            source.length >= path.length
+            && source.indexOf(path, source.length - path.length) !== -1
+            && isDisplayed(image)
+        ) {
+            images.push(image);
+            loaded.push(image.complete && image.naturalWidth > 0);
+        }
+    }
+
+    return [images, loaded];
+"""
+
+
+# Script checking all the images of the page at once. Returns the URLs of the
+# broken images, of those still loading, and the load time in milliseconds of
+# each image URL according to the Resource Timing API. Lazy images not loaded
+# yet are ignored.
+PAGE_IMAGES_SCRIPT = """
+    var broken = [];
+    var loading = [];
+    var sources = {};
+
+    for (var i = 0; i < document.images.length; i++) {
+        var image = document.images[i];
+        var source = image.currentSrc || image.src;
+
+        if (!source) {
+            continue;
+        }
+
+        sources[source] = true;
+
+        if (!image.complete) {
+            if (image.loading !== 'lazy') {
+                loading.push(source);
+            }
+        } else if (!image.naturalWidth) {
+            broken.push(source);
+        }
+    }
+
+    var timings = performance.getEntriesByType('resource').filter(
+        function (entry) {
+            return entry.initiatorType === 'img' || entry.name in sources;
+        }
+    ).map(function (entry) {
+        return [entry.name, entry.duration];
+    });
+
+    return {broken: broken, loading: loading, timings: timings};
+"""
+
+
+def find_images(path):
+    """
+    Find the visible images matching the given path in a single query.
+
+    :param path: String to match against the end of the image URL, see
+        `get_image_elements`.
+    :return: A list of pairs (image, whether the image has loaded).
+    """
+
+    images, loaded = world.browser.execute_script(FIND_IMAGES_SCRIPT, path)
+
+    return list(zip(images, loaded))
+
 
 def get_image_elements(
         path, allow_multiple_images=True, assert_images_exist=True):
@@ -33,15 +160,7 @@ def get_image_elements(
     :return: A list of images.
     """
 
-    xpath = '//img[contains(@src, "{}")]'.format(path)
-    images = find_visible_elements_by_xpath(xpath)
-
-    if images:
-        images = [
-            image
-            for image in images
-            if image.get_attribute('src').endswith(path)
-        ]
+    images = [image for image, __ in find_images(path)]
 
     if assert_images_exist:
         assert images, (
@@ -67,6 +186,35 @@ def should_see_images(self, path):
     get_image_elements(path, allow_multiple_images=True)
 
 
+@step(
+    r"images with (?:file path|filename) {STRING} should be loaded$".format(
+        STRING=CAPTURE_STRING,
+    ))
+@wait_for
+def images_should_be_loaded(self, path):
+    """
+    Assert that the images with given path|filename have loaded.
+
+    Fails if there are no visible images with the path, or if any of them is
+    still loading or broken.
+    """
+
+    images = find_images(path)
+
+    assert images, "Image with file path '{}' was not present.".format(path)
+
+    broken = len([image for image, loaded in images if not loaded])
+
+    assert not broken, (
+        "{broken} of {found} images with file path '{path}' have not"
+        " loaded.".format(
+            broken=broken,
+            found=len(images),
+            path=path,
+        )
+    )
+
+
 @step(
     r"I should not see an image with (?:file path|filename) {STRING}$".format(
         STRING=CAPTURE_STRING,
@@ -144,3 +292,302 @@ def click_image(self, position, path):
         )
     )
     image.click()
+
+
+@step(r"no images on the page should be broken$")
+@wait_for
+def no_broken_images(self):
+    """
+    Assert that all the images on the page have loaded successfully.
+
+    All the images are checked in one script, images still loading are waited
+    for.
+    """
+
+    images = world.browser.execute_script(PAGE_IMAGES_SCRIPT)
+
+    assert not images['loading'], (
+        "Images still loading:\n{}".format('\n'.join(images['loading']))
+    )
+
+    assert not images['broken'], (
+        "Broken images:\n{}".format('\n'.join(images['broken']))
+    )
+
+
+@step(r"all images should load within {NUMBER} ms$".format(
+    NUMBER=CAPTURE_NUMBER,
+))
+@wait_for
+def images_load_within(self, milliseconds):
+    """
+    Assert that all the images on the page loaded within the given time.
+
+    :param milliseconds: Maximum load time of each image.
+
+    Load times are taken from the Resource Timing entries of the images, from
+    the start of each request to the end of its response. Browsers keep a
+    limited number of entries (250 by default).
+    """
+
+    images = world.browser.execute_script(PAGE_IMAGES_SCRIPT)
+
+    assert not images['loading'], (
+        "Images still loading:\n{}".format('\n'.join(images['loading']))
+    )
+
+    slow = [
+        (url, duration)
+        for url, duration in images['timings']
+        if duration > float(milliseconds)
+    ]
+
+    assert not slow, (
+        "Images loading slower than {milliseconds} ms:\n{slow}".format(
+            milliseconds=milliseconds,
+            slow='\n'.join(
+                '{0}: {1:.0f} ms'.format(url, duration)
+                for url, duration in slow
+            ),
+        )
+    )
+
+
+def open_image(source):
+    """
+    Open an image with Pillow.
+
+    :param source: Path or binary file object.
+    :return: A Pillow image.
+    """
+
+    try:
+        from PIL import Image
+    except ImportError:
+        assert False, "Pillow is required for comparing images."
+
+    return Image.open(source)
+
+
+def perceptual_hash(image):
+    """
+    Difference hash of an image.
+
+    :param image: A Pillow image.
+    :return: A 64-bit integer. Similar images have hashes with few different
+        bits, regardless of small changes in size, compression or colour.
+    """
+
+    from PIL import Image
+
+    # One byte per pixel in greyscale.
+    pixels = bytearray(
+        image.convert('L').resize((9, 8), Image.LANCZOS).tobytes())
+
+    value = 0
+
+    for row in range(8):
+        for column in range(8):
+            index = row * 9 + column
+            value = value << 1 | int(pixels[index] > pixels[index + 1])
+
+    return value
+
+
+def hash_distance(first, second):
+    """
+    Number of different bits between two perceptual hashes.
+    """
+
+    return bin(first ^ second).count('1')
+
+
+def baseline_dir():
+    """
+    Directory containing the baseline images, `world.BASELINE_DIR`.
+    """
+
+    assert hasattr(world, 'BASELINE_DIR'), (
+        "BASELINE_DIR is required for comparing images with baselines."
+    )
+
+    return world.BASELINE_DIR
+
+
+def baseline_hash(path):
+    """
+    Perceptual hash of a baseline image, cached on disk.
+
+    :param path: Path to the baseline image.
+    :return: The perceptual hash of the image.
+
+    Hashes are stored in `BASELINE_HASHES_FILENAME` next to the baselines and
+    computed again only if the baseline changes.
+    """
+
+    cache_path = os.path.join(os.path.dirname(path), BASELINE_HASHES_FILENAME)
+
+    try:
+        with io.open(cache_path) as cache_file:
+            hashes = json.load(cache_file)
+    except (IOError, ValueError):
+        hashes = {}
+
+    stat = os.stat(path)
+    key = os.path.basename(path)
+
+    cached = hashes.get(key)
+    if cached and cached['mtime'] == stat.st_mtime and \
+            cached['size'] == stat.st_size:
+        return cached['hash']
+
+    value = perceptual_hash(open_image(path))
+
+    hashes[key] = {
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'hash': value,
+    }
+
+    with io.open(cache_path, 'w') as cache_file:
+        cache_file.write(json.dumps(hashes, indent=2, sort_keys=True))
+
+    return value
+
+
+def changed_pixels(image, baseline):
+    """
+    Compare two images pixel by pixel.
+
+    :param image: A Pillow image.
+    :param baseline: A Pillow image.
+    :return: A tuple (fraction of changed pixels, Pillow image showing them in
+        white). If the sizes differ, all the pixels are considered changed and
+        there is no image of the changes.
+
+    Pixels are changed if any of their channels differs by more than
+    `PIXEL_TOLERANCE`. NumPy is used if installed.
+    """
+
+    if image.size != baseline.size:
+        return 1.0, None
+
+    image = image.convert('RGB')
+    baseline = baseline.convert('RGB')
+
+    if NUMPY_IS_INSTALLED:
+        from PIL import Image
+
+        difference = numpy.abs(
+            numpy.asarray(image, dtype=numpy.int16)
+            - numpy.asarray(baseline, dtype=numpy.int16)
+        ).max(axis=2)
+        changed = difference > PIXEL_TOLERANCE
+
+        return (
+            float(changed.mean()),
+            Image.fromarray((changed * 255).astype(numpy.uint8)),
+        )
+
+    from PIL import ImageChops
+
+    red, green, blue = ImageChops.difference(image, baseline).split()
+    difference = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    changed = difference.point(
+        lambda value: 255 if value > PIXEL_TOLERANCE else 0)
+
+    width, height = image.size
+
+    return changed.histogram()[255] / float(width * height), changed
+
+
+def compare_with_baseline(png, baseline_name):
+    """
+    Compare a screenshot with a baseline image.
+
+    :param png: PNG image data.
+    :param baseline_name: Filename of the baseline in `world.BASELINE_DIR`.
+    :return: None.
+
+    Perceptual hashes are compared first, the pixels are only compared when
+    the hashes differ. On failure, the screenshot and an image of the changed
+    pixels are written next to the baseline, ending in `.actual.png` and
+    `.diff.png`.
+
+    Missing baselines are created from the screenshot and the comparison
+    fails, so they are reviewed. If `world.UPDATE_BASELINES` is set, baselines
+    are replaced by the screenshots instead.
+    """
+
+    path = os.path.join(baseline_dir(), baseline_name)
+    image = open_image(io.BytesIO(png))
+
+    if getattr(world, 'UPDATE_BASELINES', False):
+        image.save(path)
+        return
+
+    if not os.path.exists(path):
+        image.save(path)
+
+        assert False, "Baseline {path} created, check it is right.".format(
+            path=path,
+        )
+
+    if hash_distance(perceptual_hash(image), baseline_hash(path)) <= \
+            PERCEPTUAL_HASH_THRESHOLD:
+        return
+
+    fraction, changes = changed_pixels(image, open_image(path))
+
+    if fraction <= CHANGED_PIXELS_TOLERANCE:
+        return
+
+    stem = os.path.splitext(path)[0]
+    image.save(stem + '.actual.png')
+    if changes is not None:
+        changes.save(stem + '.diff.png')
+
+    assert False, (
+        "Image differs from baseline {path} in {percentage:.2f}% of the"
+        " pixels.".format(
+            path=path,
+            percentage=fraction * 100,
+        )
+    )
+
+
+@step(
+    r'the element with id {STRING} should look like baseline {STRING}$'.format(
+        STRING=CAPTURE_STRING,
+    ))
+def element_should_look_like_baseline(self, element_id, baseline_name):
+    """
+    Compare a screenshot of an element with a baseline image.
+
+    :param element_id: Id of the element.
+    :param baseline_name: Filename of the baseline image, see
+        `compare_with_baseline`.
+    """
+
+    element = world.browser.find_element_by_id(element_id)
+
+    compare_with_baseline(element.screenshot_as_png, baseline_name)
+
+
+@step(
+    r'the image with (?:file path|filename) {STRING} should look like baseline'
+    r' {STRING}$'.format(
+        STRING=CAPTURE_STRING,
+    ))
+def image_should_look_like_baseline(self, path, baseline_name):
+    """
+    Compare the image with given path|filename with a baseline image.
+
+    :param path: The image path or part of it.
+    :param baseline_name: Filename of the baseline image, see
+        `compare_with_baseline`.
+    """
+
+    image = get_image_elements(path, allow_multiple_images=False)[0]
+
+    compare_with_baseline(image.screenshot_as_png, baseline_name)
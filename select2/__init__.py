@@ -1,9 +1,7 @@
 """Gherkin steps related to `Select2` plugin."""
 from __future__ import unicode_literals
 
-from time import sleep
-
-from aloe import step, world
+from aloe import before, step, world
 from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
 
@@ -16,14 +14,456 @@ from aloe_webdriver_extra.util import (
     find_select_element_by_label,
     get_select_xpath,
     nth_element,
+    script_timeout,
     StringHelper,
     wait_for,
 )
 
 
-# Time in seconds to wait after an action is performed over a Select2 element
-# before trying to interact with it.
-WAIT_AFTER_ACTION = 0.3
+# Maximum time in seconds to wait for a Select2 element to react to an action,
+# e.g. to open its dropdown or to render the results of a search.
+WAIT_FOR_EVENT_TIMEOUT = 5
+
+# Script running an action and calling back as soon as a condition is met. The
+# DOM is observed for changes instead of polling, so steps proceed as soon as
+# Select2 has opened or rendered its results. Scripts can exchange values with
+# Python through `data`, it is returned along with whether the condition was
+# met.
+WAIT_FOR_CONDITION_SCRIPT = """
+    var callback = arguments[arguments.length - 1];
+    var timeout = arguments[0];
+    var element = arguments[1];
+    var data = arguments[2];
+    var widget = null;
+    var observer = null;
+    var timer = null;
+
+    function isReady() {
+        %(condition)s
+    }
+
+    function finish(ready) {
+        if (observer) {
+            observer.disconnect();
+        }
+        clearTimeout(timer);
+        callback([ready, data]);
+    }
+
+    %(action)s
+
+    if (isReady()) {
+        finish(true);
+        return;
+    }
+
+    observer = new MutationObserver(function () {
+        if (isReady()) {
+            finish(true);
+        }
+    });
+    observer.observe(document.body, {
+        attributes: true,
+        attributeFilter: ['class', 'style', 'aria-selected'],
+        childList: true,
+        subtree: true
+    });
+    timer = setTimeout(function () {
+        finish(false);
+    }, timeout);
+"""
+
+# The search box of the open Select2 element is visible.
+SEARCH_BOX_IS_VISIBLE = """
+    var searchBox = document.querySelector(
+        '.select2-container--open .select2-search__field');
+    return Boolean(searchBox && searchBox.offsetParent);
+"""
+
+# The open Select2 element shows results and is not loading them any more. For
+# widgets with remote data (see `TRACK_REMOTE_RESULTS`), the response to the
+# last search must have been rendered too, or a message (e.g. an error) shown.
+RESULTS_ARE_RENDERED = """
+    var results = document.querySelector(
+        '.select2-container--open .select2-results__options');
+
+    if (
+        !results
+        || results.querySelector(
+            '.loading-results, .select2-results__option--loading')
+    ) {
+        return false;
+    }
+
+    var requests = widget && widget.trackedRequests;
+
+    return Boolean(
+        !requests
+        || requests.rendered === requests.latest
+        || results.querySelector('.select2-results__message')
+    );
+"""
+
+# Find the Select2 widget the element belongs to and, if it loads its results
+# remotely, track its queries and requests. Responses are cached in
+# `data.cache` (keyed by URL and parameters) when given, new responses are
+# added to `data.responses`.
+TRACK_REMOTE_RESULTS = """
+    if (window.jQuery) {
+        window.jQuery('select').each(function () {
+            var candidate = window.jQuery(this).data('select2');
+
+            if (
+                candidate
+                && (
+                    candidate.$container[0].contains(element)
+                    || candidate.$dropdown[0].contains(element)
+                )
+            ) {
+                widget = candidate;
+            }
+        });
+    }
+
+    if (
+        widget
+        && widget.options.get('ajax')
+        && widget.dataAdapter.ajaxOptions
+        && !widget.trackedRequests
+    ) {
+        var requests = widget.trackedRequests = {latest: 0, rendered: 0};
+        var adapter = widget.dataAdapter;
+        var query = adapter.query;
+        var transport = adapter.ajaxOptions.transport;
+
+        adapter.query = function (params, queryCallback) {
+            var id = ++requests.latest;
+
+            return query.call(this, params, function () {
+                queryCallback.apply(this, arguments);
+
+                if (id === requests.latest) {
+                    requests.rendered = id;
+                }
+            });
+        };
+
+        adapter.ajaxOptions.transport = function (options, success, failure) {
+            var id = requests.latest;
+            var key = options.url + ' ' + JSON.stringify(options.data);
+            var cache = requests.data.cache;
+            var responses = requests.data.responses;
+
+            if (cache && key in cache) {
+                success(cache[key]);
+                return {abort: function () {}};
+            }
+
+            return transport.call(this, options, function (response) {
+                if (cache) {
+                    responses[key] = response;
+                }
+                success.apply(this, arguments);
+            }, function () {
+                // Aborted requests are superseded by a later search.
+                if (id === requests.latest) {
+                    requests.rendered = id;
+                }
+                failure.apply(this, arguments);
+            });
+        };
+    }
+
+    if (widget && widget.trackedRequests) {
+        widget.trackedRequests.data = data;
+    }
+"""
+
+# The 'input' event is necessary to trigger the Select2 search, specially
+# when an element has been already selected.
+DISPATCH_INPUT_EVENT = """
+    element.dispatchEvent(new Event("input", {
+        "bubbles": true,
+        "cancelable": true
+    }));
+"""
+
+
+def select2_wait_for_condition(condition, element=None, action='', data=None):
+    """
+    Run an action in the browser and wait until a condition is met.
+
+    :param condition: JavaScript function body returning whether the Select2
+        element is ready.
+    :param element: Selenium element available to the scripts as `element`.
+    :param action: JavaScript statements to run before waiting. [Optional]
+    :param data: JSON-serialisable value available to the scripts as `data`.
+        [Optional]
+    :return: The value of `data` after the condition is met, as modified by the
+        scripts.
+
+    Fails if the condition is not met within `WAIT_FOR_EVENT_TIMEOUT` seconds.
+    """
+
+    script = WAIT_FOR_CONDITION_SCRIPT % {
+        'action': action,
+        'condition': condition,
+    }
+
+    timeout = int(WAIT_FOR_EVENT_TIMEOUT * 1000)
+
+    # The driver must not give up before the script does.
+    with script_timeout(WAIT_FOR_EVENT_TIMEOUT + 5):
+        ready, data = world.browser.execute_async_script(
+            script, timeout, element, data)
+
+    assert ready, 'Select2 element is not ready.'
+
+    return data
+
+
+def clear_select2_results_cache(scenario, *args):
+    """
+    Forget the remote Select2 results cached during the previous scenario.
+    """
+
+    world.select2_results_cache = {}
+
+
+before.each_example(
+    function=clear_select2_results_cache,
+    name='clear_select2_results_cache',
+)
+
+
+# Script selecting an option through the Select2 API, returns a status code.
+# Widgets loading their options remotely or creating them (tags) can't be
+# handled without searching, 'ui' is returned for them.
+SELECT_WITH_API_SCRIPT = """
+    var select = arguments[0];
+    var text = arguments[1];
+    var selectIt = arguments[2];
+
+    function normalize(value) {
+        return value.replace(/\\s+/g, ' ').trim();
+    }
+
+    if (!window.jQuery) {
+        return 'ui';
+    }
+
+    var $select = window.jQuery(select);
+    var widget = $select.data('select2');
+
+    if (!widget || widget.options.get('ajax') || widget.options.get('tags')) {
+        return 'ui';
+    }
+
+    var option = null;
+    for (var i = 0; i < select.options.length; i++) {
+        if (normalize(select.options[i].text) === normalize(text)) {
+            option = select.options[i];
+            break;
+        }
+    }
+
+    if (!option) {
+        return 'missing';
+    }
+    if (option.disabled) {
+        return 'disabled';
+    }
+    if (selectIt !== null && option.selected === selectIt) {
+        return selectIt ? 'selected' : 'unselected';
+    }
+
+    var value = option.value;
+
+    if (select.multiple) {
+        value = ($select.val() || []).filter(function (selected) {
+            return selected !== option.value;
+        });
+
+        if (selectIt !== false) {
+            value.push(option.value);
+        }
+    }
+
+    $select.val(value).trigger('change');
+
+    return option.selected === (selectIt !== false) ? 'ok' : 'failed';
+"""
+
+# Messages for the errors returned by `SELECT_WITH_API_SCRIPT`.
+SELECT_WITH_API_ERRORS = {
+    'missing': 'Option "{option}" not found in "{label}"',
+    'disabled': 'Option "{option}" is disabled in "{label}"',
+    'selected': 'Option "{option}" is already selected in "{label}"',
+    'unselected': 'Option "{option}" is not selected in "{label}"',
+    'failed': 'Option "{option}" could not be changed in "{label}"',
+}
+
+
+# Script checking several options of a multiselect before selecting them all
+# at once, through the Select2 API if `useApi` is set. Returns the errors as
+# pairs (option text, status code) and whether the options were selected.
+# Widgets loading their options remotely or creating them (tags) only have the
+# options selected so far, the rest are found by searching.
+SELECT_MANY_SCRIPT = """
+    var select = arguments[0];
+    var texts = arguments[1];
+    var useApi = arguments[2];
+
+    function normalize(value) {
+        return value.replace(/\\s+/g, ' ').trim();
+    }
+
+    var $select = window.jQuery && window.jQuery(select);
+    var widget = $select && $select.data('select2');
+    var searchOnly = Boolean(
+        widget && (widget.options.get('ajax') || widget.options.get('tags'))
+    );
+
+    var options = {};
+    for (var i = 0; i < select.options.length; i++) {
+        var text = normalize(select.options[i].text);
+
+        if (!(text in options)) {
+            options[text] = select.options[i];
+        }
+    }
+
+    var errors = [];
+    var found = [];
+
+    texts.forEach(function (text) {
+        var option = options[normalize(text)];
+
+        if (!option) {
+            if (!searchOnly) {
+                errors.push([text, 'missing']);
+            }
+        } else if (option.disabled) {
+            errors.push([text, 'disabled']);
+        } else if (option.selected) {
+            errors.push([text, 'selected']);
+        } else {
+            found.push([text, option]);
+        }
+    });
+
+    if (errors.length || !useApi || !widget || searchOnly) {
+        return {errors: errors, selected: false};
+    }
+
+    var values = ($select.val() || []).concat(found.map(function (pair) {
+        return pair[1].value;
+    }));
+
+    $select.val(values).trigger('change');
+
+    return {
+        errors: found.filter(function (pair) {
+            return !pair[1].selected;
+        }).map(function (pair) {
+            return [pair[0], 'failed'];
+        }),
+        selected: true
+    };
+"""
+
+
+def select2_use_api():
+    """
+    Whether Select2 options should be set through the API.
+
+    Enabled by setting `world.SELECT2_USE_API` to True. It is faster, but the
+    search box is not used, options must match their text exactly and only the
+    `change` event is triggered.
+    """
+
+    return getattr(world, 'SELECT2_USE_API', False)
+
+
+def select2_select_with_api(label, position, option_text, select_it=True):
+    """
+    Select/unselect an option through the Select2 jQuery API in one script.
+
+    :param label: String. Label associated with the control.
+    :param position: Integer. 1-based index of the desired select box. If not
+        set, it defaults to 1.
+    :param option_text: The text displayed on the option.
+    :param select_it: Whether to select or deselect the option, None for
+        non-multiselect Select elements.
+    :return: False if the widget must be used through its UI instead (e.g. it
+        loads its options remotely), True otherwise.
+
+    The underlying Select element is updated with `$(select).val(...)` and a
+    `change` event is triggered, then the option state is verified.
+    """
+
+    select = find_select_element_by_label(label, position, is_select2=True)
+
+    status = world.browser.execute_script(
+        SELECT_WITH_API_SCRIPT, select, option_text, select_it)
+
+    if status == 'ui':
+        return False
+
+    assert status == 'ok', SELECT_WITH_API_ERRORS[status].format(
+        option=option_text,
+        label=label,
+    )
+
+    return True
+
+
+def select2_type_search(search_box, text):
+    """
+    Type the given text on a Select2 search box and wait for the results.
+
+    :param search_box: A Selenium element for the search box.
+    :param text: String to search for. Select2 filtering is case insensitive.
+    :return: None.
+
+    For widgets loading their results remotely, it waits until the response to
+    the search has been rendered, not just until an option is displayed.
+    """
+
+    try:
+        search_box.clear()
+    except WebDriverException:
+        pass
+
+    try:
+        search_box.send_keys(text)
+    except WebDriverException:
+        # `send_keys` doesn't work on some versions of Geckodriver and Firefox
+        # https://github.com/mozilla/geckodriver/issues/647
+        # Use this alternative instead.
+        world.browser.execute_script(
+            'arguments[0].value = {text};'.format(
+                text=StringHelper.javascript_escape_quotes(text),
+            ),
+            search_box,
+        )
+
+    # Remote results are cached for the scenario if `SELECT2_CACHE_RESULTS`
+    # is set, so repeated searches don't wait for the server.
+    cache = None
+    if getattr(world, 'SELECT2_CACHE_RESULTS', False):
+        cache = getattr(world, 'select2_results_cache', {})
+
+    data = select2_wait_for_condition(
+        RESULTS_ARE_RENDERED,
+        element=search_box,
+        action=TRACK_REMOTE_RESULTS + DISPATCH_INPUT_EVENT,
+        data={'cache': cache, 'responses': {}},
+    )
+
+    if cache is not None:
+        cache.update(data['responses'])
+        world.select2_results_cache = cache
 
 
 @wait_for
@@ -68,9 +508,8 @@ def select2_enter_text_for_search(label, position, text):
         action.move_to_element(container).click().perform()
     except WebDriverException:
         container.click()
-    finally:
-        # Wait for the search box to be displayed.
-        sleep(WAIT_AFTER_ACTION)
+
+    select2_wait_for_condition(SEARCH_BOX_IS_VISIBLE)
 
     search_box_xpath = '//span{span_class}//input{input_class}'.format(
         span_class=class_xpath('select2-container--open'),
@@ -79,34 +518,7 @@ def select2_enter_text_for_search(label, position, text):
 
     search_box = world.browser.find_element_by_xpath(search_box_xpath)
 
-    try:
-        search_box.clear()
-    except WebDriverException:
-        pass
-
-    try:
-        search_box.send_keys(text)
-    except WebDriverException:
-        # `send_keys` doesn't work on some versions of Geckodriver and Firefox
-        # https://github.com/mozilla/geckodriver/issues/647
-        # Use this alternative instead.
-        world.browser.execute_script(
-            'arguments[0].value = {text};'.format(
-                text=StringHelper.javascript_escape_quotes(text),
-            ),
-            search_box,
-        )
-
-    # The 'input' event is necessary to trigger the Select2 search, specially
-    # when an element has been already selected.
-    script = """
-        var event = new Event("input", {
-            "bubbles": true,
-            "cancelable": true
-        });
-        arguments[0].dispatchEvent(event);
-    """
-    world.browser.execute_script(script, search_box)
+    select2_type_search(search_box, text)
 
     return container
 
@@ -161,6 +573,9 @@ def select2_dropdown(self, value, label):
     @return: None.
     """
 
+    if select2_use_api() and select2_select_with_api(label, 1, value, None):
+        return
+
     container = select2_enter_text_for_search(label, 1, value)
 
     select2_click_option(container, value, select_it=None)
@@ -194,11 +609,96 @@ def select2_numbered_multiselect(self, deselect, value, position, label):
 
     select_option = bool(deselect is None)
 
+    if select2_use_api() and select2_select_with_api(
+            label, position, value, select_option):
+        return
+
     container = select2_enter_text_for_search(label, position, value)
 
     select2_click_option(container, value, select_it=select_option)
 
 
+@wait_for
+def select2_select_many_with_script(label, position, values):
+    """
+    Check several options of a multiselect and select them through the API.
+
+    :param label: String. Label associated with the control.
+    :param position: Integer. 1-based index of the desired select box. If not
+        set, it defaults to 1.
+    :param values: List of the texts of the options.
+    :return: Whether the options were selected through the Select2 API,
+        otherwise they must be selected through the search box.
+
+    Retried if the Select element is rendered again meanwhile. Options of
+    widgets loading them remotely or creating them (tags) are only reported
+    missing when searching for them.
+    """
+
+    select = find_select_element_by_label(label, position, is_select2=True)
+
+    result = world.browser.execute_script(
+        SELECT_MANY_SCRIPT, select, values, select2_use_api())
+
+    assert not result['errors'], '\n'.join(
+        SELECT_WITH_API_ERRORS[status].format(option=value, label=label)
+        for value, status in result['errors']
+    )
+
+    return result['selected']
+
+
+@step(
+    r'I select the following from {POSITION}multiselect {STRING}:$'.format(
+        POSITION=CAPTURE_OPTIONAL_POSITION,
+        STRING=CAPTURE_STRING,
+    ))
+def select2_multiselect_many(self, position, label):
+    """
+    Select several values from a multiselect dropdown rendered using Select2.
+
+    :param self: Aloe step from decorator.
+    :param position: Integer. 1-based index of the desired select box. If not
+        set, it defaults to 1.
+    :param label: String. Label associated with the control.
+    :return: None.
+
+    All the values are checked in one script first (retried if the Select
+    element is rendered again), values that are missing, disabled or already
+    selected are reported together and nothing is selected. Then they are
+    selected at once through the Select2 API (if `world.SELECT2_USE_API` is
+    set and the widget allows it), or one by one through the search box of the
+    widget, which is only opened once. Values missing from widgets loading
+    their options remotely or creating them (tags) are only found by searching.
+
+    Example:
+        When I select the following from multiselect "Tags":
+            | Apple |
+            | Mango |
+    """
+
+    assert self.table is not None, 'Values to select not specified'
+
+    values = [value for (value,) in self.table]
+
+    if select2_select_many_with_script(label, position, values):
+        return
+
+    container = select2_enter_text_for_search(label, position, values[0])
+    select2_click_option(container, values[0])
+
+    # The search box of a multiselect is inside the container and stays there
+    # after each selection. Typing on it opens the widget again.
+    search_box = container.find_element_by_xpath(
+        './/input{input_class}'.format(
+            input_class=class_xpath('select2-search__field'),
+        ))
+
+    for value in values[1:]:
+        select2_type_search(search_box, value)
+        select2_click_option(container, value)
+
+
 @step(
     r'option {STRING} should be (disabled|enabled) in {POSITION}selector '
     r'{STRING}$'.format(
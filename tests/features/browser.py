@@ -129,6 +129,9 @@ def with_browser():
     with temporary_directory() as temp_dir:
         world.DOWNLOAD_DIR = temp_dir
 
+        # A remote browser saves the files in its own filesystem.
+        world.ISOLATE_DOWNLOADS = 'SELENIUM_ADDRESS' not in os.environ
+
         world.browser = create_browser()
 
         yield
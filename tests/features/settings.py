@@ -0,0 +1,16 @@
+"""Steps changing the settings of the steps being tested."""
+from __future__ import unicode_literals
+
+from aloe import after, step, world
+
+
+@step(r'Select2 options are set through the API$')
+def use_select2_api(self):
+    """Set the options of Select2 widgets through their jQuery API."""
+    world.SELECT2_USE_API = True
+
+
+@after.each_example
+def reset_settings(scenario, outline, steps):
+    """Restore the default settings after each scenario."""
+    world.SELECT2_USE_API = False
@@ -35,6 +35,7 @@ reload(aloe_webdriver_extra.date_and_time)
 reload(aloe_webdriver_extra.debug)
 reload(aloe_webdriver_extra.files.csv)
 reload(aloe_webdriver_extra.files.download)
+reload(aloe_webdriver_extra.files.json)
 reload(aloe_webdriver_extra.files.pdf)
 reload(aloe_webdriver_extra.files.xlsx)
 reload(aloe_webdriver_extra.form)
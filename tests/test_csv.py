@@ -66,6 +66,42 @@ class TestCSVLookup(FeatureTest):
             | lisa   | 25  |                          |
         """
 
+    @feature()
+    def test_download_again(self):
+        """
+        When I visit test page "csv_test"
+        And I click "Download"
+        Then file "csv_test.csv" should be downloaded
+        And downloaded csv file "csv_test.csv" should have 4 rows
+
+        When I click "Download updated"
+        Then file "csv_test.csv" should be downloaded
+        And downloaded csv file "csv_test.csv" should have 5 rows
+        And downloaded csv file "csv_test.csv" should contain:
+            | person | age |
+            | amy    | 41  |
+        """
+
+    @feature()
+    def test_checksum_and_size(self):
+        """
+        When I visit test page "csv_test"
+        And I click "Download"
+        Then downloaded file "csv_test.csv" should have sha256 "26f0e0c35aaf64290b128b920a12edf0fcdf92876bf94f7b74191110926a71bc"
+        And downloaded file "csv_test.csv" should be between 100 and 200 bytes
+        And downloaded files should match:
+            | file         | md5 | size |
+            | csv_test.csv |     | 115  |
+        """
+
+    @feature(fails=True)
+    def test_checksum_fails(self):
+        """
+        When I visit test page "csv_test"
+        And I click "Download"
+        Then downloaded file "csv_test.csv" should be at most 100 bytes
+        """
+
     @feature()
     def test_in_order_passes(self):
         """
@@ -78,6 +114,22 @@ class TestCSVLookup(FeatureTest):
             | dan    | 33  |                |
         """
 
+    @feature()
+    def test_in_parallel_passes(self):
+        """
+        When I visit test page "csv_test"
+        And I click "Download"
+        Then downloaded csv file "csv_test.csv" should contain in parallel:
+            | person | favourite food__contains |
+            | dan    |                          |
+            | bob    | rice                     |
+        And downloaded csv file "csv_test.csv" should contain rows in order in parallel:
+            | person | age | favourite food |
+            | bob    | 50  | fried rice     |
+            | lisa   | 25  | steamed rice   |
+            | dan    | 33  |                |
+        """
+
     @feature(fails=True)
     def test_out_of_order_fails(self):
         """
@@ -153,3 +205,28 @@ class TestCSVLookup(FeatureTest):
             | person | age | favourite food | is_ok |
             | bob    | 50  | fried rice     | true  |
         """
+
+    @feature()
+    def test_matches_reference_file(self):
+        """
+        When I visit test page "csv_test"
+        And I click "Download"
+        Then downloaded csv file "csv_test.csv" should match reference file "static_files/csv_test.csv"
+        And downloaded csv file "csv_test.csv" should match reference file "reference_files/csv_test_unordered.csv" in any order ignoring columns "age"
+        """
+
+    @feature(fails=True)
+    def test_reference_file_order_fails(self):
+        """
+        When I visit test page "csv_test"
+        And I click "Download"
+        Then downloaded csv file "csv_test.csv" should match reference file "reference_files/csv_test_unordered.csv" ignoring columns "age"
+        """
+
+    @feature(fails=True)
+    def test_reference_file_values_fail(self):
+        """
+        When I visit test page "csv_test"
+        And I click "Download"
+        Then downloaded csv file "csv_test.csv" should match reference file "reference_files/csv_test_unordered.csv" in any order
+        """
@@ -0,0 +1,575 @@
+"""Test utilities for downloaded files."""
+from __future__ import unicode_literals
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from unittest import TestCase
+
+from aloe import world
+from mock import patch
+
+from aloe_webdriver_extra.files import json as json_files
+from aloe_webdriver_extra.files import pdf
+from aloe_webdriver_extra.files.xlsx import read_xlsx_cells
+from aloe_webdriver_extra.files import csv as csv_files
+from aloe_webdriver_extra.files.csv import (
+    diff_csv_in_any_order,
+    find_rows_in_parallel,
+    match_csv_chunk,
+    record_boundaries,
+)
+from aloe_webdriver_extra.files.download import check_manifest_entry
+from aloe_webdriver_extra.files.util import (
+    PREFETCHED,
+    clear_prefetched,
+    existing_downloads,
+    find_downloaded_file,
+    find_rows,
+    open_file,
+    prefetch_file,
+    prefetch_key,
+    prefetched_future,
+)
+
+
+class TestFindRows(TestCase):
+    """Test finding rows given in a feature test."""
+
+    rows = [
+        {'person': 'bob', 'age': 50, 'favourite food': 'fried rice'},
+        {'person': 'lisa', 'age': 25, 'favourite food': 'steamed rice'},
+        {'person': 'dan', 'age': 33, 'favourite food': None},
+    ]
+
+    def test_exact_and_lookups(self):
+        """Rows are found using exact values and lookups."""
+
+        found = find_rows(self.rows, [
+            {'person': 'dan', 'age': 33},
+            {'favourite food__contains': 'steamed'},
+            {'person__equals': 'bob', 'favourite food__contains': 'rice'},
+        ])
+
+        self.assertEqual(found, [2, 1, 0])
+
+    def test_missing_rows(self):
+        """Rows not found are reported as None."""
+
+        found = find_rows(self.rows, [
+            {'person': 'bob', 'age': 25},
+            {'unknown column': 'bob'},
+            {'person': 'lisa'},
+        ])
+
+        self.assertEqual(found, [None, None, 1])
+
+    def test_single_pass(self):
+        """Rows are iterated once and no further than needed."""
+
+        rows = iter(self.rows)
+
+        self.assertEqual(find_rows(rows, [{'age': 25}]), [1])
+        self.assertEqual(next(rows)['person'], 'dan')
+
+
+class TestOpenFile(TestCase):
+    """Test opening compressed files and archive members."""
+
+    content = 'person,age\nbob,50\n'
+
+    def setUp(self):
+        """Create a compressed file and an archive."""
+
+        self.directory = tempfile.mkdtemp()
+
+        with gzip.open(self.path('data.csv.gz'), 'wt') as gzip_file:
+            gzip_file.write(self.content)
+
+        with zipfile.ZipFile(self.path('bundle.zip'), 'w') as archive:
+            archive.writestr('data.csv', self.content)
+            archive.write(self.path('data.csv.gz'), 'data.csv.gz')
+
+    def tearDown(self):
+        """Remove the files."""
+
+        shutil.rmtree(self.directory)
+
+    def path(self, filename):
+        """Full path to a file in the temporary directory."""
+
+        return os.path.join(self.directory, filename)
+
+    def test_compressed_files(self):
+        """Compressed files and archive members are read transparently."""
+
+        for filename in (
+                'data.csv.gz',
+                'bundle.zip:data.csv',
+                'bundle.zip:data.csv.gz',
+        ):
+            with open_file(self.path(filename), text=True) as stream:
+                self.assertEqual(stream.read(), self.content)
+
+    def test_manifest_entry(self):
+        """Compressed files are hashed and measured as downloaded."""
+
+        with zipfile.ZipFile(self.path('bundle.zip')) as archive:
+            content = archive.read('data.csv.gz')
+
+        path = self.path('bundle.zip:data.csv.gz')
+        digest = hashlib.sha256(content).hexdigest()
+
+        self.assertEqual(check_manifest_entry(path, {
+            'sha256': digest.upper(),
+            'size': str(len(content)),
+        }), [])
+        self.assertEqual(len(check_manifest_entry(path, {
+            'md5': digest,
+            'min size': '',
+            'max size': str(len(content) - 1),
+        })), 2)
+
+    def test_missing_member(self):
+        """Missing archive members are reported."""
+
+        with self.assertRaises(AssertionError):
+            with open_file(self.path('bundle.zip:other.csv')):
+                pass
+
+
+class TestFindDownloadedFile(TestCase):
+    """Test telling new downloads from previous ones."""
+
+    def setUp(self):
+        """Use a temporary download directory."""
+
+        self.directory = tempfile.mkdtemp()
+        world.DOWNLOAD_DIR = self.directory
+        world.scenario_download_dir = None
+
+    def tearDown(self):
+        """Remove the directory and the settings."""
+
+        shutil.rmtree(self.directory)
+        del world.DOWNLOAD_DIR
+        del world.scenario_download_dir
+        world.previous_downloads = {}
+
+    def write(self, filename, mtime):
+        """Create a file with the given modification time."""
+
+        path = os.path.join(self.directory, filename)
+
+        with open(path, 'w') as stream:
+            stream.write(filename)
+
+        os.utime(path, (mtime, mtime))
+
+        return path
+
+    def test_previous_downloads(self):
+        """Files existing before the step are stale once newer ones appear."""
+
+        previous = self.write('data.csv', 1000)
+        self.write('other.pdf', 1000)
+        world.previous_downloads = existing_downloads()
+
+        self.assertEqual(find_downloaded_file('data.csv'), previous)
+        self.assertIsNone(find_downloaded_file('data.pdf'))
+
+        # Downloaded again within the same second, renamed by the browser.
+        renamed = self.write('data(1).csv', 1000)
+
+        self.assertEqual(find_downloaded_file('data.csv'), renamed)
+
+        # Overwritten.
+        overwritten = self.write('data.csv', 1001)
+
+        self.assertEqual(find_downloaded_file('data.csv'), overwritten)
+
+
+class TestReadXlsxCells(TestCase):
+    """Test reading cells of XLSX files."""
+
+    def setUp(self):
+        """Create a workbook with two sheets."""
+
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            self.skipTest("OpenPyXL is not installed.")
+
+        workbook = Workbook()
+
+        people = workbook.active
+        people.title = 'People'
+        people.append(['person', 'age'])
+        people.append(['bob', 50])
+        people.append(['lisa', 25])
+
+        totals = workbook.create_sheet('Totals')
+        totals['B2'] = 75
+        totals['C4'] = 'people'
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'people.xlsx')
+        workbook.save(self.path)
+
+    def tearDown(self):
+        """Remove the workbook."""
+
+        shutil.rmtree(self.directory)
+
+    def test_several_sheets(self):
+        """Cells of several sheets are read at once."""
+
+        self.assertEqual(
+            read_xlsx_cells(self.path, {
+                'People': ['A2', 'B3'],
+                'Totals': ['C4', 'B2'],
+            }),
+            {
+                ('People', 'A2'): 'bob',
+                ('People', 'B3'): 25,
+                ('Totals', 'B2'): 75,
+                ('Totals', 'C4'): 'people',
+            },
+        )
+
+    def test_first_sheet(self):
+        """The first sheet is used if none is given."""
+
+        self.assertEqual(
+            read_xlsx_cells(self.path, {None: ['A1', 'B2']}),
+            {(None, 'A1'): 'person', (None, 'B2'): 50},
+        )
+
+    def test_outside_used_range(self):
+        """Cells outside the used range are empty."""
+
+        self.assertEqual(
+            read_xlsx_cells(self.path, {'People': ['B2', 'D2', 'A10']}),
+            {
+                ('People', 'B2'): 50,
+                ('People', 'D2'): None,
+                ('People', 'A10'): None,
+            },
+        )
+
+    def test_missing_sheet(self):
+        """Missing sheets are reported."""
+
+        with self.assertRaises(AssertionError):
+            read_xlsx_cells(self.path, {'Orders': ['A1']})
+
+
+class TestRecordBoundaries(TestCase):
+    """Test splitting CSV files at record boundaries."""
+
+    def test_quoted_line_breaks(self):
+        """Line breaks inside quoted values don't end records."""
+
+        content = b'id,note\n1,"a\nb"\n2,c\n3,"d\n""e""\nf"\n4,g\n'
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as csv_file:
+            csv_file.write(content)
+            csv_file.flush()
+
+            boundaries = record_boundaries(
+                csv_file.name, list(range(len(content))))
+
+        self.assertEqual(boundaries, [8, 16, 20, 34, 38])
+
+    def test_match_chunk(self):
+        """Chunks are read up to their end, quoted line breaks included."""
+
+        content = b'id,note\n1,"a\nb"\n2,c\n3,"d\n""e""\nf"\n4,g\n'
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as csv_file:
+            csv_file.write(content)
+            csv_file.flush()
+
+            found = match_csv_chunk(csv_file.name, 16, 34, ['id', 'note'], [
+                {'note': 'd\n"e"\nf'},
+                {'id': 1},
+                {'id': 2},
+            ])
+
+            self.assertEqual(found, ([1, None, 0], 2))
+
+            self.assertEqual(
+                find_rows_in_parallel(csv_file.name, [
+                    {'id': 4},
+                    {'note': 'a\nb'},
+                    {'id': 5},
+                ]),
+                [3, 0, None],
+            )
+
+
+class TestDiffCsv(TestCase):
+    """Test comparing CSV files with reference files."""
+
+    def setUp(self):
+        """Create the files."""
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the files."""
+
+        shutil.rmtree(self.directory)
+
+    def write(self, filename, content):
+        """Create a CSV file with the given content."""
+
+        path = os.path.join(self.directory, filename)
+
+        with io.open(path, 'w') as csv_file:
+            csv_file.write(content)
+
+        return path
+
+    def test_any_order(self):
+        """Rows are compared as multisets, files are read once if equal."""
+
+        path = self.write('data.csv', 'id,name\n1,bob\n2,lisa\n2,lisa\n')
+        same = self.write('same.csv', 'name,id\nlisa,2\nbob,1\nlisa,2\n')
+        other = self.write('other.csv', 'id,name\n2,lisa\n3,dan\n')
+
+        with patch.object(
+                csv_files, 'csv_column_values',
+                wraps=csv_files.csv_column_values) as csv_column_values:
+            self.assertEqual(
+                diff_csv_in_any_order(path, same, ['id', 'name'], 10), [])
+            self.assertEqual(csv_column_values.call_count, 2)
+
+        self.assertEqual(
+            diff_csv_in_any_order(path, other, ['id', 'name'], 10),
+            [
+                "Unexpected row: ('1', 'bob')",
+                "Unexpected row: ('2', 'lisa')",
+                "Missing row: ('3', 'dan')",
+            ],
+        )
+
+
+class TestJsonRecords(TestCase):
+    """Test reading JSON and NDJSON files incrementally."""
+
+    records = [
+        {'id': 1, 'customer': {'name': 'bob'}, 'paid': True},
+        {'id': 2, 'customer': {'name': 'lisa'}, 'paid': False},
+        {'id': 3, 'customer': None, 'note': 'a, "b" ] c'},
+    ]
+
+    def setUp(self):
+        """Use small blocks, so elements are split between them."""
+
+        self.block_size = json_files.READ_BLOCK_SIZE
+        json_files.READ_BLOCK_SIZE = 4
+
+    def tearDown(self):
+        """Restore the block size."""
+
+        json_files.READ_BLOCK_SIZE = self.block_size
+
+    def test_json_array(self):
+        """Array elements are parsed one at a time."""
+
+        stream = io.StringIO(' [ {"id": 1, "customer": {"name": "bob"},'
+                             ' "paid": true},{"id":2,"customer":{"name":'
+                             '"lisa"},"paid":false} ,\n{"id": 3, "customer":'
+                             ' null, "note": "a, \\"b\\" ] c"}]\n')
+
+        self.assertEqual(
+            list(json_files.iter_json_array(stream)), self.records)
+
+    def test_numbers_between_blocks(self):
+        """Numbers at the end of a block are not cut."""
+
+        stream = io.StringIO('[12345, 678]')
+
+        self.assertEqual(
+            list(json_files.iter_json_array(stream)), [12345, 678])
+
+    def test_invalid_array(self):
+        """Truncated arrays are reported."""
+
+        with self.assertRaises(AssertionError):
+            list(json_files.iter_json_array(io.StringIO('[{"id": 1}, {"id"')))
+
+    def test_malformed_array(self):
+        """Missing commas and content after the array are reported."""
+
+        for content in ('[1 2 3]', '[1, 2] 3', '[1, 2]]'):
+            with self.assertRaises(ValueError):
+                list(json_files.iter_json_array(io.StringIO(content)))
+
+        for content in ('[1,,,2]', '[1, 2,]', '[, 1]'):
+            with self.assertRaises(AssertionError):
+                list(json_files.iter_json_array(io.StringIO(content)))
+
+        self.assertEqual(
+            list(json_files.iter_json_array(io.StringIO(' [ ]\n '))), [])
+
+    def test_ndjson_records(self):
+        """NDJSON records are flattened and their types guessed."""
+
+        with tempfile.NamedTemporaryFile(
+                mode='w', suffix='.ndjson') as json_file:
+            for record in self.records:
+                json_file.write(json.dumps(record) + '\n\n')
+            json_file.flush()
+
+            records = list(json_files.json_records(json_file.name))
+
+        self.assertEqual(records[0], {
+            'id': 1, 'customer.name': 'bob', 'paid': True})
+        self.assertEqual(records[2]['customer'], None)
+        self.assertEqual(
+            find_rows(records, [
+                {'customer.name__contains': 'lis'},
+                {'note__contains': '"b"'},
+            ]),
+            [1, 2],
+        )
+
+
+class TestPdfPagesText(TestCase):
+    """Test extracting the text of PDF files page by page."""
+
+    path = os.path.join(
+        os.path.dirname(__file__), 'static_files', 'pages.pdf')
+
+    def setUp(self):
+        """Start without any page extracted."""
+
+        if not pdf.PDFMINER_IS_INSTALLED:
+            self.skipTest("pdfminer.six is not installed.")
+
+        pdf.PAGES_TEXT_CACHE.clear()
+
+    def tearDown(self):
+        """Forget the files parsed in the background."""
+
+        clear_prefetched()
+
+    def test_pages(self):
+        """Pages are extracted in order, or only the requested one."""
+
+        self.assertEqual(list(pdf.pdf_pages_text(self.path)), [
+            (1, 'Invoice 1 Total:'),
+            (2, '100 EUR Page two text'),
+            (3, 'Third page Grand total'),
+        ])
+        self.assertEqual(
+            list(pdf.pdf_pages_text(self.path, 2)),
+            [(2, '100 EUR Page two text')],
+        )
+
+    def test_single_page(self):
+        """The document is not read past the requested page."""
+
+        get_pages = pdf.PDFPage.get_pages
+        pages_read = []
+
+        def read_pages(*args, **kwargs):
+            """Record the pages read."""
+
+            for page in get_pages(*args, **kwargs):
+                pages_read.append(page)
+                yield page
+
+        with patch.object(pdf.PDFPage, 'get_pages', read_pages):
+            self.assertEqual(
+                list(pdf.pdf_pages_text(self.path, 2)),
+                [(2, '100 EUR Page two text')],
+            )
+
+        self.assertEqual(len(pages_read), 2)
+
+    def test_missing_page(self):
+        """Pages past the end are reported."""
+
+        with self.assertRaises(AssertionError) as context:
+            list(pdf.pdf_pages_text(self.path, 4))
+
+        self.assertEqual(
+            str(context.exception), "PDF file doesn't have page 4.")
+
+    def test_text_across_pages(self):
+        """Texts split between pages are found."""
+
+        self.assertEqual(
+            pdf.missing_pdf_text(self.path, [
+                'Total:\n100  EUR',
+                'Grand total',
+                'Total: 200',
+            ]),
+            ['Total: 200'],
+        )
+        self.assertEqual(
+            pdf.missing_pdf_text(self.path, ['Total: 100', 'Page two'], 2),
+            ['Total: 100'],
+        )
+
+    def test_cache(self):
+        """Pages are cached by content, not parsed again for a copy."""
+
+        list(pdf.pdf_pages_text(self.path, 2))
+
+        with open(self.path, 'rb') as pdf_file:
+            digest = hashlib.sha256(pdf_file.read()).hexdigest()
+
+        self.assertEqual(
+            pdf.PAGES_TEXT_CACHE, {digest: {2: '100 EUR Page two text'}})
+
+        directory = tempfile.mkdtemp()
+        try:
+            copy = os.path.join(directory, 'copy.pdf')
+            shutil.copy(self.path, copy)
+
+            with patch.object(pdf.PDFPage, 'get_pages') as get_pages:
+                self.assertEqual(
+                    list(pdf.pdf_pages_text(copy, 2)),
+                    [(2, '100 EUR Page two text')],
+                )
+                get_pages.assert_not_called()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_prefetched_pages(self):
+        """Pages parsed in the background are not parsed again."""
+
+        prefetch_file(self.path)
+        prefetched_future(pdf.extract_pdf_pages, self.path).result()
+
+        with patch.object(pdf, 'parse_pdf_pages') as parse_pdf_pages:
+            self.assertEqual(
+                pdf.missing_pdf_text(self.path, ['Total: 100', 'Other']),
+                ['Other'],
+            )
+            with self.assertRaises(AssertionError):
+                list(pdf.pdf_pages_text(self.path, 4))
+
+            parse_pdf_pages.assert_not_called()
+
+    def test_failed_prefetch(self):
+        """Pages are parsed by the step if the background parsing failed."""
+
+        future = Future()
+        future.set_exception(ValueError("Incomplete file."))
+        PREFETCHED[prefetch_key(pdf.extract_pdf_pages, self.path)] = future
+
+        self.assertEqual(
+            list(pdf.pdf_pages_text(self.path, 3)),
+            [(3, 'Third page Grand total')],
+        )
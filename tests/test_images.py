@@ -1,8 +1,18 @@
 """Test Webdriver Extra steps related with images."""
 from __future__ import unicode_literals
 
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from aloe import world
 from aloe.testing import FeatureTest
+from mock import patch
 
+from aloe_webdriver_extra import image as image_steps
 from aloe_webdriver_extra.tests.base import feature
 
 
@@ -90,3 +100,202 @@ class TestImageSteps(FeatureTest):
         When I visit test page "images"
         And I click image with filename "testing_in_progress.gif
         """
+
+    @feature()
+    def test_images_are_loaded(self):
+        """
+        When I visit test page "images"
+        Then images with file path "images/play.png" should be loaded
+        And images with filename "testing_in_progress.gif" should be loaded
+        """
+
+    @feature(fails=True)
+    def test_broken_image_is_not_loaded(self):
+        """
+        When I visit test page "images"
+        Then images with filename "missing.png" should be loaded
+        """
+
+    @feature()
+    def test_no_broken_images(self):
+        """
+        When I visit test page "accessibility"
+        Then no images on the page should be broken
+        And all images should load within 5000 ms
+        """
+
+    @feature(fails=True)
+    def test_broken_images(self):
+        """
+        When I visit test page "images"
+        Then no images on the page should be broken
+        """
+
+
+class TestBaselines(TestCase):
+    """Test comparing images with baselines."""
+
+    def setUp(self):
+        """Use a temporary baselines directory."""
+
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest("Pillow is not installed.")
+
+        self.image_module = Image
+        self.directory = tempfile.mkdtemp()
+        world.BASELINE_DIR = self.directory
+
+    def tearDown(self):
+        """Remove the directory and the settings."""
+
+        shutil.rmtree(self.directory)
+        del world.BASELINE_DIR
+
+    def path(self, filename):
+        """Full path to a file in the baselines directory."""
+
+        return os.path.join(self.directory, filename)
+
+    def gradient(self, size=(100, 100)):
+        """An image getting lighter from left to right."""
+
+        width, height = size
+        image = self.image_module.new('RGB', size)
+        image.putdata([
+            (255 * column // width,) * 3
+            for __ in range(height)
+            for column in range(width)
+        ])
+
+        return image
+
+    def changed(self, image, box=(0, 0, 10, 10)):
+        """A copy of an image with a red box."""
+
+        image = image.copy()
+        image.paste((255, 0, 0), box)
+
+        return image
+
+    @staticmethod
+    def png(image):
+        """PNG data of an image."""
+
+        stream = io.BytesIO()
+        image.save(stream, 'PNG')
+
+        return stream.getvalue()
+
+    def test_perceptual_hash(self):
+        """Resized images have the same hash, mirrored ones don't."""
+
+        image = self.gradient()
+        mirrored = image.transpose(self.image_module.FLIP_LEFT_RIGHT)
+
+        self.assertEqual(
+            image_steps.perceptual_hash(image),
+            image_steps.perceptual_hash(self.gradient((200, 150))),
+        )
+        self.assertEqual(image_steps.hash_distance(
+            image_steps.perceptual_hash(image),
+            image_steps.perceptual_hash(mirrored),
+        ), 64)
+
+    def test_hash_distance(self):
+        """Different bits are counted."""
+
+        self.assertEqual(image_steps.hash_distance(0b1011, 0b1011), 0)
+        self.assertEqual(image_steps.hash_distance(0b1011, 0b0001), 2)
+        self.assertEqual(image_steps.hash_distance(0, 2 ** 64 - 1), 64)
+
+    def test_changed_pixels(self):
+        """Pixels differing beyond the tolerance are counted."""
+
+        image = self.gradient()
+
+        fraction, changes = image_steps.changed_pixels(
+            image, self.changed(image))
+
+        self.assertEqual(fraction, 0.01)
+        self.assertEqual(changes.size, image.size)
+        self.assertEqual(changes.getpixel((5, 5)), 255)
+        self.assertEqual(changes.getpixel((50, 50)), 0)
+
+        slightly_changed = image.point(
+            lambda value: min(value + image_steps.PIXEL_TOLERANCE, 255))
+
+        self.assertEqual(
+            image_steps.changed_pixels(image, slightly_changed)[0], 0.0)
+        self.assertEqual(
+            image_steps.changed_pixels(image, self.gradient((100, 50))),
+            (1.0, None),
+        )
+
+    def test_baseline_hash_cache(self):
+        """Hashes are cached until the baseline changes."""
+
+        path = self.path('gradient.png')
+        self.gradient().save(path)
+
+        value = image_steps.baseline_hash(path)
+
+        self.assertEqual(value, image_steps.perceptual_hash(self.gradient()))
+
+        with io.open(self.path(image_steps.BASELINE_HASHES_FILENAME)) as cache:
+            self.assertEqual(json.load(cache)['gradient.png']['hash'], value)
+
+        with patch.object(image_steps, 'perceptual_hash') as perceptual_hash:
+            self.assertEqual(image_steps.baseline_hash(path), value)
+            perceptual_hash.assert_not_called()
+
+        mirrored = self.gradient().transpose(
+            self.image_module.FLIP_LEFT_RIGHT)
+        mirrored.save(path)
+        os.utime(path, (0, 0))
+
+        self.assertEqual(
+            image_steps.baseline_hash(path),
+            image_steps.perceptual_hash(mirrored),
+        )
+
+    def test_compare_with_baseline(self):
+        """Failures leave the screenshot and its changes by the baseline."""
+
+        image = self.gradient()
+
+        with self.assertRaises(AssertionError):
+            image_steps.compare_with_baseline(self.png(image), 'page.png')
+
+        self.assertTrue(os.path.exists(self.path('page.png')))
+
+        image_steps.compare_with_baseline(self.png(image), 'page.png')
+
+        self.assertFalse(os.path.exists(self.path('page.actual.png')))
+        self.assertFalse(os.path.exists(self.path('page.diff.png')))
+
+        with self.assertRaises(AssertionError):
+            image_steps.compare_with_baseline(
+                self.png(self.changed(image)), 'page.png')
+
+        actual = self.image_module.open(self.path('page.actual.png'))
+        self.assertEqual(actual.getpixel((5, 5)), (255, 0, 0))
+
+        diff = self.image_module.open(self.path('page.diff.png'))
+        self.assertEqual(diff.getpixel((5, 5)), 255)
+        self.assertEqual(diff.getpixel((50, 50)), 0)
+
+    def test_update_baselines(self):
+        """Baselines are replaced when updating them."""
+
+        self.gradient().save(self.path('page.png'))
+        changed = self.changed(self.gradient())
+
+        world.UPDATE_BASELINES = True
+        try:
+            image_steps.compare_with_baseline(self.png(changed), 'page.png')
+        finally:
+            del world.UPDATE_BASELINES
+
+        image_steps.compare_with_baseline(self.png(changed), 'page.png')
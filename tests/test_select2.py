@@ -55,3 +55,103 @@ class TestSelect2Steps(FeatureTest):
         And option "Tomato" should be disabled in the 2nd selector "Extra Fruits"
         And option "Durian" should be enabled in the 2nd selector "Extra Fruits"
         """
+
+    @feature()
+    def test_multiselect_many(self):
+        """
+        When I visit test page "select2"
+        And I select the following from multiselect "Fruits":
+            | Mango |
+            | Fig   |
+            | Date  |
+        And I click "Submit"
+        Then I should see "Mango,Date,Fig:::"
+        """
+
+    @feature(fails=True)
+    def test_multiselect_many_already_selected(self):
+        """
+        When I visit test page "select2"
+        And I select "Mango" from multiselect "Fruits"
+        And I select the following from multiselect "Fruits":
+            | Mango |
+            | Fig   |
+        """
+
+    @feature()
+    def test_remote_multiselect(self):
+        """
+        When I visit test page "select2"
+        And I select "Lime" from multiselect "Remote Fruits"
+        And I select "Lemon" from multiselect "Remote Fruits"
+        Then option "Lime" should be enabled in selector "Remote Fruits"
+        And option "Lemon" should be enabled in selector "Remote Fruits"
+        """
+
+    @feature()
+    def test_select2_api(self):
+        """
+        Given Select2 options are set through the API
+        When I visit test page "select2"
+        And I select "Cranberry" in dropdown "More Extra Fruits"
+        And I select 'Pineapple "2.0"' from the 1st multiselect 'Fruits'
+        And I select "Mango" from multiselect "Fruits"
+        And I select "Kiwi" from the 2nd multiselect "Fruits"
+        And I click "Submit"
+        Then I should see 'Pineapple "2.0",Mango:Kiwi::Cranberry'
+
+        When I deselect 'Pineapple "2.0"' from multiselect 'Fruits'
+        And I deselect "Kiwi" from multiselect "More Fruits"
+        And I click "Submit"
+        Then I should see "Mango:::Cranberry"
+        """
+
+    @feature()
+    def test_select2_api_many(self):
+        """
+        Given Select2 options are set through the API
+        When I visit test page "select2"
+        And I select the following from multiselect "Fruits":
+            | Mango |
+            | Fig   |
+            | Date  |
+        And I click "Submit"
+        Then I should see "Mango,Date,Fig:::"
+        """
+
+    @feature()
+    def test_select2_api_remote(self):
+        """
+        Given Select2 options are set through the API
+        When I visit test page "select2"
+        And I select "Lime" from multiselect "Remote Fruits"
+        Then option "Lime" should be enabled in selector "Remote Fruits"
+        """
+
+    @feature(fails=True)
+    def test_select2_api_already_selected(self):
+        """
+        Given Select2 options are set through the API
+        When I visit test page "select2"
+        And I select "Mango" from multiselect "Fruits"
+        And I select "Mango" from multiselect "Fruits"
+        """
+
+    @feature(fails=True)
+    def test_select2_api_not_selected(self):
+        """
+        Given Select2 options are set through the API
+        When I visit test page "select2"
+        And I deselect "Mango" from multiselect "Fruits"
+        """
+
+    @feature()
+    def test_remote_multiselect_many(self):
+        """
+        When I visit test page "select2"
+        And I select the following from multiselect "Remote Fruits":
+            | Lime  |
+            | Lemon |
+        Then option "Lime" should be enabled in selector "Remote Fruits"
+        And option "Lemon" should be enabled in selector "Remote Fruits"
+        """
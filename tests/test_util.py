@@ -1,9 +1,14 @@
 """Test Webdriver Extra utilities."""
 from __future__ import unicode_literals
 
+from unittest import TestCase
+
+from aloe import world
 from aloe.testing import FeatureTest
+from mock import Mock, call, patch
 
 from aloe_webdriver_extra.tests.base import feature
+from aloe_webdriver_extra.util import script_timeout
 
 
 class TestUtils(FeatureTest):
@@ -17,3 +22,25 @@ class TestUtils(FeatureTest):
             | Header 3 |
             | Value 3  |
         """
+
+
+class TestScriptTimeout(TestCase):
+    """Test changing the timeout of asynchronous scripts."""
+
+    def test_raise_and_restore(self):
+        """Longer timeouts are set for the block and then restored."""
+
+        browser = Mock()
+
+        with patch.object(world, 'browser', browser, create=True):
+            with script_timeout(10):
+                pass
+
+            browser.set_script_timeout.assert_not_called()
+
+            with self.assertRaises(AssertionError):
+                with script_timeout(40):
+                    assert False
+
+        self.assertEqual(
+            browser.set_script_timeout.call_args_list, [call(40), call(30)])
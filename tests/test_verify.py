@@ -30,6 +30,38 @@ class TestSteps(FeatureTest):
         """
         When I visit test page "verify_page"
         Then I should see "This text is repeated." 3 times
+        And I should see "split across elements" 1 time
+        """
+
+    @feature()
+    def test_should_see_all(self):
+        """
+        When I visit test page "verify_page"
+        Then I should see all of the following:
+            | Page Title                  |
+            | This text is repeated.      |
+            | Text split across elements. |
+            | Description 2               |
+            | Section heading             |
+        """
+
+    @feature()
+    def test_should_see_all_like_should_see(self):
+        """
+        When I visit test page "verify_page"
+        Then I should see "Section heading"
+        And I should see "Section heading" 1 time
+        And I should see all of the following:
+            | Section heading |
+        """
+
+    @feature(fails=True)
+    def test_should_see_all_fails(self):
+        """
+        When I visit test page "verify_page"
+        Then I should see all of the following:
+            | Page Title |
+            | Aliens     |
         """
 
     @feature()
@@ -38,6 +70,8 @@ class TestSteps(FeatureTest):
         When I visit test page "verify_page"
         Then page source should contain "This text is repeated."
         And page source should not contain "Aliens"
+        And page source should match "<p>This text is (repeated|unique)[.]</p>"
+        And page source should not match "Alien(s)?"
         """
 
     @feature()
@@ -0,0 +1,125 @@
+"""Test Webdriver Extra steps related with accessibility."""
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from aloe.testing import FeatureTest
+
+from aloe_webdriver_extra.tests.base import feature
+from aloe_webdriver_extra.wcag import contrast_ratios
+
+
+class TestWcagSteps(FeatureTest):
+    """Test steps related with accessibility."""
+
+    @feature()
+    def test_accessibility_audit_passes(self):
+        """
+        When I visit test page "accessibility"
+        Then the page should pass the accessibility audit
+        """
+
+    @feature(fails=True)
+    def test_accessibility_audit_fails(self):
+        """
+        When I visit test page "accessibility_issues"
+        Then the page should pass the accessibility audit
+        """
+
+    @feature()
+    def test_accessibility_audit_ignoring_rules(self):
+        """
+        When I visit test page "accessibility_issues"
+        Then the page should pass the accessibility audit ignoring "image-alt, duplicate-id, aria-reference, form-label"
+        """
+
+    @feature(fails=True)
+    def test_accessibility_audit_ignoring_some_rules(self):
+        """
+        When I visit test page "accessibility_issues"
+        Then the page should pass the accessibility audit ignoring "image-alt, duplicate-id"
+        """
+
+    @feature()
+    def test_screen_reader_text(self):
+        """
+        When I visit test page "accessibility"
+        Then the text "Comments" should be visible to screen reader
+        And the text "Age" should be visible to screen reader
+        And the text "Play" should be visible to screen reader
+        And the text "the menu" should be visible to screen reader
+        And the text "Email" should be visible to screen reader
+        And the text "Menu" should be visible to screen reader
+        """
+
+    @feature(fails=True)
+    def test_screen_reader_text_hidden(self):
+        """
+        When I visit test page "accessibility"
+        Then the text "Never read" should be visible to screen reader
+        """
+
+    @feature()
+    def test_focus_order(self):
+        """
+        When I visit test page "accessibility"
+        Then the focus order should be:
+            | Name     |
+            | email    |
+            | Age      |
+            | comments |
+            | Send     |
+            | menu     |
+        """
+
+    @feature(fails=True)
+    def test_focus_order_fails(self):
+        """
+        When I visit test page "accessibility"
+        Then the focus order should be:
+            | Name |
+            | Age  |
+        """
+
+    @feature(fails=True)
+    def test_focus_order_incomplete(self):
+        """
+        When I visit test page "accessibility"
+        Then the focus order should be:
+            | Name     |
+            | email    |
+            | Age      |
+            | comments |
+            | Send     |
+        """
+
+    @feature()
+    def test_contrast_ratio(self):
+        """
+        When I visit test page "accessibility"
+        Then text on the page should meet contrast ratio AAA
+        """
+
+    @feature(fails=True)
+    def test_contrast_ratio_fails(self):
+        """
+        When I visit test page "accessibility_issues"
+        Then text on the page should meet contrast ratio AA
+        """
+
+
+class TestContrastRatios(TestCase):
+    """Test computing contrast ratios."""
+
+    def test_contrast_ratios(self):
+        """Ratios follow WCAG, semi-transparent text is blended."""
+
+        ratios = contrast_ratios(
+            [[0, 0, 0, 1], [119, 119, 119, 1], [0, 0, 0, 0], [0, 0, 0, 0.5]],
+            [[255, 255, 255], [255, 255, 255], [0, 0, 0], [255, 255, 255]],
+        )
+
+        self.assertEqual(
+            [round(ratio, 2) for ratio in ratios],
+            [21.0, 4.48, 1.0, 3.98],
+        )
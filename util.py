@@ -3,6 +3,7 @@ from __future__ import division, unicode_literals
 
 import operator
 
+from contextlib import contextmanager
 from functools import wraps
 from time import time, sleep
 
@@ -76,6 +77,11 @@ HTML5_FIELD_TYPES = [
 JAVASCRIPT = 'javascript'
 XPATH = 'xpath'
 
+# Timeout in seconds for asynchronous scripts the browser is assumed to have,
+# unless `world.SCRIPT_TIMEOUT` is set. Selenium can't read it, this is the
+# WebDriver default.
+DEFAULT_SCRIPT_TIMEOUT = 30
+
 
 class StringHelper(object):
     """
@@ -435,6 +441,32 @@ def find_option_in_select_element(select_element, label, raise_error=True):
     return None
 
 
+@contextmanager
+def script_timeout(seconds):
+    """
+    Let the browser run asynchronous scripts for at least the given time.
+
+    :param seconds: Minimum timeout in seconds.
+    :return: A context manager.
+
+    The timeout is only raised, never lowered, and restored on exit to
+    `world.SCRIPT_TIMEOUT` (`DEFAULT_SCRIPT_TIMEOUT` if not set), so the
+    session keeps its own timeout for other scripts.
+    """
+
+    previous = getattr(world, 'SCRIPT_TIMEOUT', DEFAULT_SCRIPT_TIMEOUT)
+
+    if seconds <= previous:
+        yield
+        return
+
+    world.browser.set_script_timeout(seconds)
+    try:
+        yield
+    finally:
+        world.browser.set_script_timeout(previous)
+
+
 def wait_for(func):
     """
     A decorator that retry the function when certain exceptions are detected.
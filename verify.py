@@ -3,17 +3,206 @@ from __future__ import unicode_literals
 
 from aloe import step, world
 from nose.tools import assert_equal
-from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.alert import Alert
 
 from aloe_webdriver_extra.util import (
     CAPTURE_STRING,
     CAPTURE_STRING_INSIDE_SINGLE_QUOTE,
     NUMBER,
+    script_timeout,
     wait_for,
 )
 
 
+# JavaScript functions finding the visible elements containing a text. The
+# text of the page is joined in one pass over its text nodes, with whitespace
+# normalised, then each occurrence is attributed to the deepest element
+# containing all of it. Several occurrences in the same element count once.
+FIND_TEXT_FUNCTIONS = """
+    function readPageText() {
+        var page = {content: '', starts: [], nodes: []};
+
+        var walker = document.createTreeWalker(
+            document.body, NodeFilter.SHOW_TEXT, null, false);
+
+        while (walker.nextNode()) {
+            var value = walker.currentNode.nodeValue.replace(/\\s+/g, ' ');
+
+            if (value.charAt(0) === ' ' && page.content.slice(-1) === ' ') {
+                value = value.substring(1);
+            }
+
+            page.starts.push(page.content.length);
+            page.nodes.push(walker.currentNode);
+            page.content += value;
+        }
+
+        return page;
+    }
+
+    function nodeAt(page, offset) {
+        var low = 0;
+        var high = page.starts.length - 1;
+
+        while (low < high) {
+            var middle = Math.ceil((low + high) / 2);
+
+            if (page.starts[middle] <= offset) {
+                low = middle;
+            } else {
+                high = middle - 1;
+            }
+        }
+
+        return page.nodes[low];
+    }
+
+    function commonElement(first, last) {
+        var ancestors = new Set();
+
+        for (var node = first; node; node = node.parentNode) {
+            ancestors.add(node);
+        }
+
+        for (node = last; node; node = node.parentNode) {
+            if (ancestors.has(node) && node.nodeType === Node.ELEMENT_NODE) {
+                return node;
+            }
+        }
+
+        return null;
+    }
+
+    function isDisplayed(element) {
+        return element.getClientRects().length
+            && window.getComputedStyle(element).visibility === 'visible';
+    }
+
+    // Visible elements containing the text, up to `limit` if given.
+    function elementsContaining(page, text, limit) {
+        var elements = new Set();
+        var displayed = [];
+        var position = text ? page.content.indexOf(text) : -1;
+
+        while (position !== -1 && displayed.length !== limit) {
+            var element = commonElement(
+                nodeAt(page, position),
+                nodeAt(page, position + text.length - 1));
+
+            if (element && !elements.has(element)) {
+                elements.add(element);
+
+                if (isDisplayed(element)) {
+                    displayed.push(element);
+                }
+            }
+
+            position = page.content.indexOf(text, position + 1);
+        }
+
+        return displayed;
+    }
+"""
+
+# Script counting the visible elements containing a text.
+COUNT_TEXT_SCRIPT = FIND_TEXT_FUNCTIONS + """
+    return elementsContaining(readPageText(), arguments[0]).length;
+"""
+
+
+# Script looking for a text or a regular expression in the serialised DOM,
+# returns the offset of the first match or -1.
+SOURCE_SEARCH_SCRIPT = """
+    var source = document.documentElement.outerHTML;
+
+    if (arguments[1]) {
+        var match = new RegExp(arguments[0]).exec(source);
+        return match ? match.index : -1;
+    }
+
+    return source.indexOf(arguments[0]);
+"""
+
+
+# Maximum time in seconds to wait for the texts of
+# `I should see all of the following` to appear, as `wait_for` does.
+SEE_ALL_TIMEOUT = 15
+
+# Script looking for several texts in the visible elements of the page, like
+# `COUNT_TEXT_SCRIPT`. While some are missing, the page is checked again after
+# it changes, until the timeout. Calls back with the texts still missing.
+SEE_ALL_SCRIPT = FIND_TEXT_FUNCTIONS + """
+    var callback = arguments[arguments.length - 1];
+    var texts = arguments[0];
+    var timeout = arguments[1];
+
+    function normalize(value) {
+        return (value || '').replace(/\\s+/g, ' ').trim();
+    }
+
+    var expected = texts.map(normalize);
+
+    function missing() {
+        var page = readPageText();
+
+        return texts.filter(function (text, index) {
+            return !elementsContaining(page, expected[index], 1).length;
+        });
+    }
+
+    var remaining = missing();
+
+    if (!remaining.length) {
+        callback(remaining);
+        return;
+    }
+
+    var done = false;
+    var scheduled = false;
+    var observer = null;
+    var timer = null;
+
+    function finish() {
+        done = true;
+        observer.disconnect();
+        clearTimeout(timer);
+        callback(remaining);
+    }
+
+    function check() {
+        scheduled = false;
+
+        if (done) {
+            return;
+        }
+
+        remaining = missing();
+
+        if (!remaining.length) {
+            finish();
+        }
+    }
+
+    // Changes come in bursts, check the text once per burst.
+    observer = new MutationObserver(function () {
+        if (!scheduled) {
+            scheduled = true;
+            setTimeout(check, 50);
+        }
+    });
+    observer.observe(document.body, {
+        attributes: true,
+        characterData: true,
+        childList: true,
+        subtree: true
+    });
+    timer = setTimeout(function () {
+        remaining = missing();
+        finish();
+    }, timeout);
+"""
+
+
 @step(r'I should see page title {STRING}$'.format(
     STRING=CAPTURE_STRING,
 ))
@@ -71,54 +260,91 @@ def multiple_should_see(self, text, repetitions):
     It searches for elements that contain the whole of the text we're looking
     for in themselves or subelements, but whose children do NOT contain that
     text - otherwise it matches <body> or <html> or other similarly useless
-    things.
+    things. Only visible elements are counted, in a single pass over the text
+    of the page (see `FIND_TEXT_FUNCTIONS`).
     """
-    try:
-        elements = [
-            elem
-            for elem in world.browser.find_elements_by_xpath(
-                r'//*[contains(normalize-space(.),"{content}") '
-                r'and not(./*[contains(normalize-space(.),"{content}")])]'
-                .format(content=text))
-            if elem.is_displayed()
-        ]
-    except NoSuchElementException:
-        raise AssertionError("Text '{text}' not found.".format(
-            text=text,
-        ))
+
+    found = world.browser.execute_script(COUNT_TEXT_SCRIPT, text)
 
     assert_equal(
-        len(elements), int(repetitions),
+        found, int(repetitions),
         "Found text '{0}' {1} times, expecting it {2} times".format(
-            text, len(elements), int(repetitions)
+            text, found, int(repetitions)
         )
     )
 
 
-@step(r'page source should( not)? contain {STRING}$'.format(
+@step(r'I should see all of the following:$')
+def should_see_all(self):
+    """
+    Check that all the texts in the table are displayed on the page.
+
+    :param self: Object reference to aloe.
+    :return: None.
+
+    The text nodes of the page are read once for all the texts, and each text
+    must be in a visible element, as with `I should see`. While some are
+    missing, the page is checked again whenever it changes, for up to
+    `SEE_ALL_TIMEOUT` seconds. All the missing texts are reported together.
+
+    Example:
+        Then I should see all of the following:
+            | Welcome   |
+            | Log out   |
+    """
+
+    assert self.table is not None, 'Texts not specified'
+
+    texts = [text for (text,) in self.table]
+
+    # The driver must not give up before the script does.
+    with script_timeout(SEE_ALL_TIMEOUT + 5):
+        missing = world.browser.execute_async_script(
+            SEE_ALL_SCRIPT, texts, int(SEE_ALL_TIMEOUT * 1000))
+
+    assert not missing, "Couldn't find:\n{missing}".format(
+        missing='\n'.join(missing),
+    )
+
+
+@step(r'page source should( not)? (contain|match) {STRING}$'.format(
     STRING=CAPTURE_STRING,
 ))
 @wait_for
-def source_content(self, not_in, text):
+def source_content(self, not_in, mode, text):
     """
     Check that the source code contains or not a specific text.
 
     :param self: Object reference to aloe. [Not used].
     :param not_in: When set, it indicates the source code of the page should
         not contain the given `text`.
+    :param mode: `contain` to look for the text as is, `match` to use it as a
+        JavaScript regular expression.
     :param text: Text to look for in the source code of the page.
     :return: None.
 
     Useful for verifying code that is not visible to the user is present or not
-    in the page.
+    in the page. The search runs in the browser on the serialised DOM, only its
+    result is transferred.
     """
     expected = True
     if not_in:
         expected = False
 
-    contains = text in world.browser.page_source
+    offset = world.browser.execute_script(
+        SOURCE_SEARCH_SCRIPT, text, mode == 'match')
 
-    assert_equal(contains, expected)
+    contains = offset != -1
+
+    assert_equal(
+        contains,
+        expected,
+        "Page source {contains} '{text}'{position}".format(
+            contains='contains' if contains else "doesn't contain",
+            text=text,
+            position=' at offset {}'.format(offset) if contains else '',
+        )
+    )
 
 
 @step(r'I should see {STRING} as the value for {STRING}$'.format(
@@ -6,7 +6,485 @@ from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.keys import Keys
 
-from aloe_webdriver_extra.util import wait_for
+from aloe_webdriver_extra.util import CAPTURE_STRING, wait_for
+
+# pylint:disable=ungrouped-imports
+try:
+    import numpy
+
+    NUMPY_IS_INSTALLED = True
+except ImportError:
+    # NumPy is not installed, contrast ratios are computed one by one.
+    NUMPY_IS_INSTALLED = False
+# pylint:enable=ungrouped-imports
+
+
+# Minimum contrast ratios for normal and large text, by conformance level.
+CONTRAST_RATIOS = {
+    'AA': (4.5, 3),
+    'AAA': (7, 4.5),
+}
+
+
+# Script checking the whole page in a single pass, returns a list of issues
+# with the name of the rule, a short description of the element and a message.
+ACCESSIBILITY_AUDIT_SCRIPT = """
+    var issues = [];
+    var elementsById = {};
+
+    function describe(element) {
+        var html = element.outerHTML.replace(/\\s+/g, ' ');
+        return html.length > 100 ? html.substring(0, 97) + '...' : html;
+    }
+
+    function report(rule, element, message) {
+        issues.push({
+            rule: rule,
+            element: describe(element),
+            message: message
+        });
+    }
+
+    function isHidden(element) {
+        return Boolean(element.closest('[aria-hidden="true"]'));
+    }
+
+    var elements = document.body.getElementsByTagName('*');
+
+    for (var i = 0; i < elements.length; i++) {
+        var id = elements[i].id;
+
+        if (id) {
+            if (id in elementsById) {
+                report(
+                    'duplicate-id', elements[i], 'Duplicate id "' + id + '"');
+            } else {
+                elementsById[id] = elements[i];
+            }
+        }
+    }
+
+    var labelled = {};
+    var labels = document.getElementsByTagName('label');
+
+    for (var i = 0; i < labels.length; i++) {
+        if (labels[i].htmlFor) {
+            labelled[labels[i].htmlFor] = true;
+        }
+    }
+
+    function hasText(element, attribute) {
+        var value = element.getAttribute(attribute);
+        return Boolean(value && value.trim());
+    }
+
+    for (var i = 0; i < elements.length; i++) {
+        var element = elements[i];
+        var tag = element.tagName.toLowerCase();
+        var type = (element.getAttribute('type') || '').toLowerCase();
+
+        ['aria-describedby', 'aria-labelledby'].forEach(function (attribute) {
+            var references = (element.getAttribute(attribute) || '').trim();
+
+            references.split(/\\s+/).forEach(function (reference) {
+                if (reference && !(reference in elementsById)) {
+                    report(
+                        'aria-reference',
+                        element,
+                        attribute + ' references missing id "'
+                        + reference + '"'
+                    );
+                }
+            });
+        });
+
+        if (isHidden(element)) {
+            continue;
+        }
+
+        if (
+            (tag === 'img' || tag === 'area' || type === 'image')
+            && !element.hasAttribute('alt')
+        ) {
+            report('image-alt', element, 'Missing alternative text');
+        }
+
+        if (
+            (tag === 'input' && [
+                'hidden', 'submit', 'reset', 'button', 'image'
+            ].indexOf(type) === -1)
+            || tag === 'select'
+            || tag === 'textarea'
+        ) {
+            if (!(
+                (element.id && labelled[element.id])
+                || element.closest('label')
+                || hasText(element, 'aria-label')
+                || hasText(element, 'aria-labelledby')
+                || hasText(element, 'title')
+            )) {
+                report('form-label', element, 'Form control without label');
+            }
+        }
+    }
+
+    return issues;
+"""
+
+# Script looking for a text in the names the elements of the page expose to
+# screen readers. Returns the source of the name where the text was found
+# (e.g. 'aria-label'), or null. Sources are tried from the cheapest to the most
+# expensive one:
+#   aria-label, alt and title attributes,
+#   text of the elements referenced by aria-labelledby,
+#   text of the labels of form controls,
+#   text hidden visually but not from screen readers (e.g. `.sr-only`).
+SCREEN_READER_TEXT_SCRIPT = """
+    function normalize(value) {
+        return (value || '').replace(/\\s+/g, ' ').trim();
+    }
+
+    var text = normalize(arguments[0]);
+
+    function contains(value) {
+        return normalize(value).indexOf(text) !== -1;
+    }
+
+    var attributes = ['aria-label', 'alt', 'title'];
+
+    for (var i = 0; i < attributes.length; i++) {
+        var elements = document.querySelectorAll('[' + attributes[i] + ']');
+
+        for (var j = 0; j < elements.length; j++) {
+            if (contains(elements[j].getAttribute(attributes[i]))) {
+                return attributes[i];
+            }
+        }
+    }
+
+    var labelled = document.querySelectorAll('[aria-labelledby]');
+
+    for (var i = 0; i < labelled.length; i++) {
+        var name = labelled[i].getAttribute('aria-labelledby').trim().split(
+            /\\s+/
+        ).map(function (id) {
+            var reference = document.getElementById(id);
+            return reference ? reference.textContent : '';
+        }).join(' ');
+
+        if (contains(name)) {
+            return 'aria-labelledby';
+        }
+    }
+
+    var labels = document.getElementsByTagName('label');
+
+    for (var i = 0; i < labels.length; i++) {
+        if (labels[i].control && contains(labels[i].textContent)) {
+            return 'label';
+        }
+    }
+
+    function isVisuallyHidden(style) {
+        return (
+            (style.clip && style.clip !== 'auto')
+            || (style.clipPath && style.clipPath !== 'none')
+            || (
+                style.overflow === 'hidden'
+                && parseFloat(style.width) <= 1
+                && parseFloat(style.height) <= 1
+            )
+        );
+    }
+
+    var walker = document.createTreeWalker(
+        document.body, NodeFilter.SHOW_TEXT, null, false);
+
+    while (walker.nextNode()) {
+        if (!contains(walker.currentNode.nodeValue)) {
+            continue;
+        }
+
+        var hidden = false;
+
+        for (
+            var element = walker.currentNode.parentElement;
+            element;
+            element = element.parentElement
+        ) {
+            var style = window.getComputedStyle(element);
+
+            if (
+                style.display === 'none'
+                || style.visibility === 'hidden'
+                || element.getAttribute('aria-hidden') === 'true'
+            ) {
+                hidden = false;
+                break;
+            }
+
+            hidden = hidden || isVisuallyHidden(style);
+        }
+
+        if (hidden) {
+            return 'visually hidden text';
+        }
+    }
+
+    return null;
+"""
+
+
+# JavaScript function describing an element by its id and the label a user
+# would read, used to compare focus orders with tables in feature tests.
+DESCRIBE_FOCUSABLE_FUNCTION = """
+    function describeFocusable(element) {
+        var label = element.getAttribute('aria-label');
+        var labelledBy = element.getAttribute('aria-labelledby');
+
+        if (!label && labelledBy) {
+            label = labelledBy.trim().split(/\\s+/).map(function (id) {
+                var reference = document.getElementById(id);
+                return reference ? reference.textContent : '';
+            }).join(' ');
+        }
+
+        if (!label && element.labels && element.labels.length) {
+            label = element.labels[0].textContent;
+        }
+
+        label = label
+            || element.getAttribute('alt')
+            || element.innerText
+            || element.value
+            || element.getAttribute('title')
+            || '';
+
+        return [element.id || '', label.replace(/\\s+/g, ' ').trim()];
+    }
+"""
+
+# Script computing the sequential focus order of the page (what TAB follows).
+# Elements with a positive tabindex come first, then the rest in document
+# order, including the content of open shadow roots. Disabled, hidden and inert
+# elements are skipped, and only one radio button of each group is included.
+FOCUS_ORDER_SCRIPT = DESCRIBE_FOCUSABLE_FUNCTION + """
+    var FOCUSABLE = [
+        'a[href]', 'area[href]', 'button', 'input', 'select', 'textarea',
+        'iframe', 'summary', 'audio[controls]', 'video[controls]',
+        '[contenteditable]', '[tabindex]'
+    ].join(',');
+
+    var candidates = [];
+
+    function collect(root) {
+        var walker = document.createTreeWalker(
+            root, NodeFilter.SHOW_ELEMENT, null, false);
+
+        while (walker.nextNode()) {
+            var element = walker.currentNode;
+
+            if (element.matches(FOCUSABLE)) {
+                candidates.push(element);
+            }
+
+            if (element.shadowRoot) {
+                collect(element.shadowRoot);
+            }
+        }
+    }
+
+    function isFocusable(element) {
+        if (
+            element.disabled
+            || element.tabIndex < 0
+            || (element.type || '').toLowerCase() === 'hidden'
+            || element.closest('[inert]')
+            || !element.getClientRects().length
+            || window.getComputedStyle(element).visibility !== 'visible'
+        ) {
+            return false;
+        }
+
+        if (element.type === 'radio' && element.name) {
+            var radio = 'input[type="radio"][name="'
+                + CSS.escape(element.name) + '"]';
+            var scope = element.form || document;
+
+            return element === (
+                scope.querySelector(radio + ':checked')
+                || scope.querySelector(radio)
+            );
+        }
+
+        return true;
+    }
+
+    collect(document.body);
+
+    var focusable = candidates.filter(isFocusable).map(
+        function (element, index) {
+            return {element: element, index: index};
+        }
+    );
+
+    focusable.sort(function (first, second) {
+        var firstTabIndex = first.element.tabIndex || Infinity;
+        var secondTabIndex = second.element.tabIndex || Infinity;
+
+        if (firstTabIndex !== secondTabIndex) {
+            return firstTabIndex < secondTabIndex ? -1 : 1;
+        }
+
+        return first.index - second.index;
+    });
+
+    return focusable.map(function (item) {
+        return describeFocusable(item.element);
+    });
+"""
+
+# Script describing the focused element, see `DESCRIBE_FOCUSABLE_FUNCTION`.
+DESCRIBE_ACTIVE_ELEMENT_SCRIPT = DESCRIBE_FOCUSABLE_FUNCTION + """
+    var element = document.activeElement;
+
+    while (element && element.shadowRoot && element.shadowRoot.activeElement) {
+        element = element.shadowRoot.activeElement;
+    }
+
+    if (!element || element === document.body) {
+        return null;
+    }
+
+    return describeFocusable(element);
+"""
+
+
+# Script collecting the colours of every element with visible text. Returns
+# the selector of each element, its text colour (RGBA), its effective
+# background colour (RGB, semi-transparent backgrounds composited over their
+# ancestors and a white canvas), its font size in pixels and its font weight.
+# Elements over background images are skipped, their contrast can't be known.
+TEXT_COLOURS_SCRIPT = """
+    function parseColour(colour) {
+        var match = /rgba?\\(([^)]*)\\)/.exec(colour);
+
+        if (!match) {
+            return null;
+        }
+
+        var parts = match[1].split(/[\\s,\\/]+/).filter(Boolean).map(
+            parseFloat);
+
+        return [parts[0], parts[1], parts[2], parts.length > 3 ? parts[3] : 1];
+    }
+
+    var backgrounds = new Map();
+
+    function background(element) {
+        if (!element || element.nodeType !== Node.ELEMENT_NODE) {
+            return [255, 255, 255];
+        }
+
+        if (backgrounds.has(element)) {
+            return backgrounds.get(element);
+        }
+
+        var style = window.getComputedStyle(element);
+        var result = null;
+
+        if (style.backgroundImage === 'none') {
+            var colour = parseColour(style.backgroundColor);
+
+            if (colour && colour[3] >= 1) {
+                result = colour.slice(0, 3);
+            } else {
+                var below = background(element.parentElement);
+
+                if (below && colour && colour[3] > 0) {
+                    result = below.map(function (value, index) {
+                        return colour[index] * colour[3]
+                            + value * (1 - colour[3]);
+                    });
+                } else {
+                    result = below;
+                }
+            }
+        }
+
+        backgrounds.set(element, result);
+
+        return result;
+    }
+
+    function selector(element) {
+        var parts = [];
+
+        for (
+            var node = element;
+            node && node.nodeType === Node.ELEMENT_NODE && parts.length < 3;
+            node = node.parentElement
+        ) {
+            var part = node.tagName.toLowerCase();
+
+            if (node.id) {
+                parts.unshift(part + '#' + node.id);
+                break;
+            }
+
+            if (node.classList.length) {
+                part += '.' + Array.prototype.join.call(node.classList, '.');
+            }
+
+            parts.unshift(part);
+        }
+
+        return parts.join(' > ');
+    }
+
+    var seen = new Set();
+    var results = [];
+    var walker = document.createTreeWalker(
+        document.body, NodeFilter.SHOW_TEXT, null, false);
+
+    while (walker.nextNode()) {
+        var element = walker.currentNode.parentElement;
+
+        if (
+            !element
+            || seen.has(element)
+            || !walker.currentNode.nodeValue.trim()
+        ) {
+            continue;
+        }
+
+        seen.add(element);
+
+        var style = window.getComputedStyle(element);
+
+        if (
+            style.visibility !== 'visible'
+            || !element.getClientRects().length
+        ) {
+            continue;
+        }
+
+        var colour = parseColour(style.color);
+        var backgroundColour = background(element);
+
+        if (colour && backgroundColour) {
+            results.push([
+                selector(element),
+                colour,
+                backgroundColour,
+                parseFloat(style.fontSize),
+                parseInt(style.fontWeight, 10) || 400
+            ]);
+        }
+    }
+
+    return results;
+"""
 
 
 @step(r'an image with id "(.*?)" '
@@ -80,32 +558,17 @@ def verify_element_attribute_value(self, expected_sr_text):
 
     :param self: Object reference to aloe.
     :param expected_sr_text: Value expected to be visible to screen reader.
-    :return: True iff the given text is found as attribute value of any HTML
-        element used for accessibility.
+    :return: True iff the given text is found as part of the accessible name
+        of any HTML element, see `SCREEN_READER_TEXT_SCRIPT`.
+
+    The names are computed in the browser in a single call, which returns as
+    soon as the text is found.
     """
 
-    attribute_names = [
-        'aria-label',
-    ]
+    source = world.browser.execute_script(
+        SCREEN_READER_TEXT_SCRIPT, expected_sr_text)
 
-    screen_readable_text_found = False
-    for name in attribute_names:
-        try:
-            elements = world.browser.find_elements_by_xpath(
-                '//*[@{}]'.format(name))
-        except NoSuchElementException:
-            raise AssertionError(
-                "Text '{text}' not part of an aria-label attribute.".format(
-                    text=expected_sr_text,
-                ))
-
-        if any(
-                expected_sr_text in element.get_attribute(name)
-                for element in elements):
-            screen_readable_text_found = True
-            break
-
-    assert screen_readable_text_found, (
+    assert source, (
         "The text '{txt}' was not found to be screen readable.".format(
             txt=expected_sr_text
         )
@@ -168,3 +631,330 @@ def special_key_press(self, key_name):
     )
 
     ActionChains(world.browser).send_keys(key).perform()
+
+
+def accessibility_audit():
+    """
+    Check the whole page for common accessibility issues in one script.
+
+    :return: List of issues, dictionaries with the `rule` broken, a short
+        description of the `element` and a `message`.
+
+    Rules:
+        image-alt: images without alternative text (`alt=""` is allowed for
+            decorative images).
+        aria-reference: `aria-describedby` and `aria-labelledby` referencing
+            ids not on the page.
+        form-label: form controls without a label, `aria-label`,
+            `aria-labelledby` or `title`.
+        duplicate-id: ids used by more than one element.
+
+    Elements hidden with `aria-hidden` are only checked for duplicate ids and
+    ARIA references.
+    """
+
+    return world.browser.execute_script(ACCESSIBILITY_AUDIT_SCRIPT)
+
+
+@step(
+    r'the page should pass the accessibility audit'
+    r'(?: ignoring {STRING})?$'.format(
+        STRING=CAPTURE_STRING,
+    ))
+@wait_for
+def verify_accessibility_audit(self, ignored_rules=None):
+    """
+    Audit the accessibility of the whole page.
+
+    :param self: Object reference to aloe. [Not used].
+    :param ignored_rules: Comma-separated names of the rules to skip, see
+        `accessibility_audit`. [Optional]
+    :return: None.
+
+    Example:
+        Then the page should pass the accessibility audit ignoring "image-alt"
+    """
+
+    ignored = set()
+    if ignored_rules:
+        ignored = {rule.strip() for rule in ignored_rules.split(',')}
+
+    issues = [
+        issue
+        for issue in accessibility_audit()
+        if issue['rule'] not in ignored
+    ]
+
+    assert not issues, (
+        "The page failed the accessibility audit:\n{issues}".format(
+            issues='\n'.join(
+                '[{rule}] {message}: {element}'.format(**issue)
+                for issue in issues
+            ),
+        )
+    )
+
+
+def focus_order_matches(expected, focus_order):
+    """
+    Compare a focus order with the expected elements.
+
+    :param expected: List of ids or labels of the elements.
+    :param focus_order: List of pairs (id, label) describing the elements.
+    :return: Whether each expected value is the id or the label of the element
+        in the same position, and no other element gets the focus.
+    """
+
+    if len(focus_order) != len(expected):
+        return False
+
+    return all(
+        value in element
+        for value, element in zip(expected, focus_order)
+    )
+
+
+# Script moving the start of sequential focus navigation to the beginning of
+# the page, by focusing a temporary element before any other. Blurring the
+# focused element isn't enough, TAB would continue from it.
+RESET_FOCUS_SCRIPT = """
+    var sentinel = document.createElement('span');
+    sentinel.tabIndex = -1;
+    sentinel.setAttribute('data-focus-sentinel', '');
+    document.body.insertBefore(sentinel, document.body.firstChild);
+    sentinel.focus();
+    window.getSelection().removeAllRanges();
+"""
+
+# Script removing the element added by `RESET_FOCUS_SCRIPT`.
+REMOVE_FOCUS_SENTINEL_SCRIPT = """
+    var sentinel = document.querySelector('[data-focus-sentinel]');
+
+    if (sentinel) {
+        sentinel.parentNode.removeChild(sentinel);
+    }
+"""
+
+
+def keyboard_focus_order(count):
+    """
+    Get the focus order by pressing TAB from the beginning of the page.
+
+    :param count: Maximum number of elements to go through.
+    :return: List of pairs (id, label) describing the focused elements. It
+        ends when the focus leaves the page.
+    """
+
+    world.browser.execute_script(RESET_FOCUS_SCRIPT)
+
+    focus_order = []
+
+    try:
+        for __ in range(count):
+            ActionChains(world.browser).send_keys(Keys.TAB).perform()
+
+            element = world.browser.execute_script(
+                DESCRIBE_ACTIVE_ELEMENT_SCRIPT)
+
+            if element is None or element in focus_order[:1]:
+                # The focus left the page or wrapped around to the start.
+                break
+
+            focus_order.append(element)
+    finally:
+        world.browser.execute_script(REMOVE_FOCUS_SENTINEL_SCRIPT)
+
+    return focus_order
+
+
+@step(r'the focus order should be:$')
+@wait_for
+def verify_focus_order(self):
+    """
+    Verify the order the elements of the page get the keyboard focus.
+
+    :param self: Object reference to aloe.
+    :return: None.
+
+    The table lists the ids or labels of all the elements reached pressing
+    TAB, in order. The order is computed in the browser in one script. If it
+    doesn't match and `world.VERIFY_FOCUS_ORDER_WITH_KEYBOARD` is set, the
+    order is checked again by pressing TAB, which is slower but follows the
+    browser exactly.
+
+    Example:
+        Then the focus order should be:
+            | Name  |
+            | email |
+            | Send  |
+    """
+
+    assert self.table is not None, 'Focus order not specified'
+
+    expected = [value for (value,) in self.table]
+
+    focus_order = world.browser.execute_script(FOCUS_ORDER_SCRIPT)
+
+    if focus_order_matches(expected, focus_order):
+        return
+
+    if getattr(world, 'VERIFY_FOCUS_ORDER_WITH_KEYBOARD', False):
+        # One more, to check that no other element follows.
+        focus_order = keyboard_focus_order(len(expected) + 1)
+
+        if focus_order_matches(expected, focus_order):
+            return
+
+    raise AssertionError(
+        "The focus order doesn't match. Found:\n{focus_order}".format(
+            focus_order='\n'.join(
+                '{0} ({1})'.format(label, element_id) if element_id else label
+                for element_id, label in focus_order
+            ),
+        )
+    )
+
+
+def relative_luminance(red, green, blue):
+    """
+    Relative luminance of an sRGB colour, as defined by WCAG 2.0.
+
+    :param red: Red component, from 0 to 255.
+    :param green: Green component, from 0 to 255.
+    :param blue: Blue component, from 0 to 255.
+    :return: Luminance, from 0 (black) to 1 (white).
+    """
+
+    def linear(value):
+        """Linearise a gamma-encoded component."""
+
+        value /= 255.0
+
+        if value <= 0.03928:
+            return value / 12.92
+
+        return ((value + 0.055) / 1.055) ** 2.4
+
+    return (
+        0.2126 * linear(red)
+        + 0.7152 * linear(green)
+        + 0.0722 * linear(blue)
+    )
+
+
+def contrast_ratios(colours, backgrounds):
+    """
+    Contrast ratios of text colours over their backgrounds.
+
+    :param colours: List of RGBA text colours, the alpha from 0 to 1.
+    :param backgrounds: List of opaque RGB background colours.
+    :return: List of contrast ratios, from 1 to 21.
+
+    Semi-transparent colours are blended with their background first. All the
+    ratios are computed at once with NumPy if installed.
+    """
+
+    if not colours:
+        return []
+
+    if NUMPY_IS_INSTALLED:
+        colours = numpy.array(colours, dtype=float)
+        backgrounds = numpy.array(backgrounds, dtype=float)
+
+        alpha = colours[:, 3:]
+        colours = colours[:, :3] * alpha + backgrounds * (1 - alpha)
+
+        def luminance(rgb):
+            """Relative luminance of an array of colours."""
+
+            rgb = rgb / 255.0
+            rgb = numpy.where(
+                rgb <= 0.03928,
+                rgb / 12.92,
+                ((rgb + 0.055) / 1.055) ** 2.4,
+            )
+
+            return rgb.dot([0.2126, 0.7152, 0.0722])
+
+        first = luminance(colours)
+        second = luminance(backgrounds)
+
+        return list(
+            (numpy.maximum(first, second) + 0.05)
+            / (numpy.minimum(first, second) + 0.05)
+        )
+
+    ratios = []
+
+    for colour, background in zip(colours, backgrounds):
+        alpha = colour[3]
+        colour = [
+            value * alpha + below * (1 - alpha)
+            for value, below in zip(colour[:3], background)
+        ]
+
+        first = relative_luminance(*colour)
+        second = relative_luminance(*background)
+
+        ratios.append(
+            (max(first, second) + 0.05) / (min(first, second) + 0.05))
+
+    return ratios
+
+
+def is_large_text(font_size, font_weight):
+    """
+    Whether text is large according to WCAG 2.0.
+
+    :param font_size: Font size in CSS pixels.
+    :param font_weight: Numeric font weight.
+    :return: True for text of at least 18pt, or 14pt if bold.
+    """
+
+    return font_size >= 24 or (font_size >= 18.66 and font_weight >= 700)
+
+
+@step(r'text on the page should meet contrast ratio (AAA|AA)$')
+@wait_for
+def verify_text_contrast(self, level):
+    """
+    Verify the contrast of all the visible text on the page.
+
+    :param self: Object reference to aloe. [Not used].
+    :param level: WCAG conformance level, either `AA` or `AAA`.
+    :return: None.
+
+    Colours are collected in the browser in a single pass (see
+    `TEXT_COLOURS_SCRIPT`) and the ratios computed together in Python. Only the
+    elements below the required ratio are reported.
+    """
+
+    elements = world.browser.execute_script(TEXT_COLOURS_SCRIPT)
+
+    ratios = contrast_ratios(
+        [colour for __, colour, __, __, __ in elements],
+        [background for __, __, background, __, __ in elements],
+    )
+
+    normal_ratio, large_ratio = CONTRAST_RATIOS[level]
+
+    violations = []
+
+    for (selector, __, __, font_size, font_weight), ratio in zip(
+            elements, ratios):
+        required = normal_ratio
+        if is_large_text(font_size, font_weight):
+            required = large_ratio
+
+        if ratio < required:
+            violations.append((selector, ratio, required))
+
+    assert not violations, (
+        "Text with insufficient contrast for {level}:\n{violations}".format(
+            level=level,
+            violations='\n'.join(
+                '{0}: {1:.2f}, required {2}'.format(*violation)
+                for violation in violations
+            ),
+        )
+    )